@@ -39,9 +39,14 @@ setup(
     packages=find_packages('src'),
     package_dir={'': 'src'},
     include_package_data=True,
+    extras_require={
+        'simulate': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'photo2cnccut = photo2cnccut.ui:main',
+            'photo2cnccut-nest = photo2cnccut.nest:main',
+            'photo2cnccut-compare = photo2cnccut.compare:main',
         ],
     },
     python_requires='~=3.6',
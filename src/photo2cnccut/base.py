@@ -2,14 +2,21 @@
 
 """Define data interface from point data to formatted files."""
 
+import concurrent.futures
+import contextlib
+import io
+import itertools
 import math
 import os
+import re
 import subprocess
 import textwrap
 
 import PIL.Image
+import PIL.ImageChops
+import PIL.ImageDraw
 
-from photo2cnccut import ui
+from photo2cnccut import toolpath, ui
 
 
 class Data(object):
@@ -30,17 +37,25 @@ class Data(object):
         self.g_formatter = GFormatter
         self.svg_formatter = SVGFormatter
         self.png_formatter = PNGFormatter
+        self.draft_formatter = DraftFormatter
         self.lines = []
 
+        # 256 processed intensities for grayscale 0 to 255 (see below)
+        self.intensity_table = None
+        self.mask_pixels = None
+
         self.init2()
 
     def init2(self):
         """Customize this."""
 
-    def build(self, pixels=None, lines=None):
-        """Build self.lines."""
+    def build(self, pixels=None, lines=None, image=None):
+        """Build self.lines.
+
+        ``image`` is passed to ``.load_image`` (default: ``conf.fname``).
+        """
         if pixels is None:
-            self.load_image()
+            self.load_image(image)
         else:
             self.pixels = pixels
 
@@ -54,13 +69,26 @@ class Data(object):
     def build_lines(self):
         """Customize this."""
 
-    def load_image(self, fname=None):
-        """Load image and build self.pixels."""
-        fname = fname or self.conf.fname
-        self._im = PIL.Image.open(fname)
+    def coarsen(self, points):
+        """Customize this (coarsen sampling to about ``points`` points).
+
+        Return a dictionary of changed config names and (old, new) values.
+        """
+        return {}
+
+    def load_image(self, image=None):
+        """Load image and build self.pixels.
+
+        ``image`` is a file path, a file object, encoded bytes,
+        a PIL image or a NumPy array (see ``open_image``).
+        """
+        if image is None:
+            image = self.conf.fname
+        self._im = open_image(image)
 
         self.get_sizes(self._im)
         self.get_pixels(self._im)
+        self.get_mask(self._im)
 
         self.conf._time('load:')
 
@@ -80,9 +108,45 @@ class Data(object):
     def get_pixels(self, im):
         if im.mode != 'L':
             im = im.convert('L')  # to grayscale
+        im = self.process_pixels(im)
         # self.pixels = numpy.array(im)
         self.pixels = im.getdata()
 
+    def get_mask(self, im):
+        """Build self.mask_pixels from 'mask' and 'mask_alpha' config.
+
+        Mask is a grayscale image of the same size,
+        and points on dark pixels (< 128) are not cut.
+        """
+        mask = None
+        if self.conf.mask_alpha:
+            if im.mode == 'P' and 'transparency' in im.info:
+                im = im.convert('RGBA')
+            if 'A' in im.getbands():
+                mask = im.getchannel('A')
+        mask2 = self.conf.mask  # file path or image (see open_image)
+        if isinstance(mask2, str):
+            if mask2:
+                directory = os.path.dirname(self.conf.fname or '')
+                mask2 = os.path.join(directory, mask2)
+            else:
+                mask2 = None
+        if mask2 is not None:
+            mask2 = open_image(mask2).convert('L')
+            if mask2.size != im.size:
+                mask2 = mask2.resize(im.size)
+            mask = mask2 if mask is None else PIL.ImageChops.darker(
+                mask, mask2)
+        self.mask_pixels = None if mask is None else mask.getdata()
+
+    def process_pixels(self, im):
+        """Customize this (process whole grayscale image at once).
+
+        E.g. ``return im.point(table)`` applies a lookup table in C.
+        Note points outside of the image are still 255.
+        """
+        return im
+
     def get_intensity(self, x, y):
         intensity = self._get_intensity(x, y, self.pixels)
         return self.process_intensity(intensity)
@@ -102,30 +166,115 @@ class Data(object):
         """Customize this."""
         return intensity
 
-    def write_gcode(self, lines=None):
+    def process_intensities(self, intensities):
+        """Customize this (batch version of ``.process_intensity``).
+
+        ``intensities`` is a list of intensities of a line.
+        Return a list of the same length (``None`` omits the point).
+
+        By default, it looks up ``self.intensity_table`` if it is set,
+        or calls ``.process_intensity`` for each intensity
+        if it is overridden.
+        """
+        table = self.intensity_table
+        if table is not None:
+            return [table[i] for i in intensities]
+        if self._is_overridden('process_intensity'):
+            process = self.process_intensity
+            return [process(i) for i in intensities]
+        return intensities
+
+    def _is_overridden(self, name):
+        return getattr(type(self), name) is not getattr(Data, name)
+
+    def write_gcode(self, lines=None, file=None):
+        """Write g-code to ``file`` (default: <fname> + '.nc').
+
+        ``file`` is a text or binary file object
+        (binary files get utf-8 encoded text).
+        """
         lines = lines or self.lines
         formatter = self.g_formatter(self.conf, lines)
-        with open(self.conf.fname + '.nc', 'w') as f:
+        with _open_output(file, self.conf.fname, '.nc') as write:
             for chunk in formatter.format():
-                f.write(chunk)
+                write(chunk)
         self.info(formatter)
         self.conf._time('gcode:')
+        return formatter
 
-    def write_svg(self, lines=None):
+    def write_svg(self, lines=None, file=None):
+        """Write svg to ``file`` (default: <fname> + '.svg')."""
         lines = lines or self.lines
         formatter = self.svg_formatter(self.conf, lines)
-        with open(self.conf.fname + '.svg', 'w') as f:
+        with _open_output(file, self.conf.fname, '.svg') as write:
             for chunk in formatter.format():
-                f.write(chunk)
+                write(chunk)
         self.conf._time('svg:')
 
-    def write_png(self):
+    def write_png(self, file=None):
+        """Write png (from svg file, or built svg if ``file`` is given)."""
         formatter = self.png_formatter(self.conf)
-        formatter.format()
+        if file is None:
+            formatter.format()
+        else:
+            file.write(formatter.convert(self.get_svg()))
         self.conf._time('png:')
 
+    def get_gcode(self, lines=None):
+        """Return g-code as bytes (without writing any files)."""
+        f = io.BytesIO()
+        self.write_gcode(lines, file=f)
+        return f.getvalue()
+
+    def get_svg(self, lines=None):
+        """Return svg as bytes."""
+        f = io.BytesIO()
+        self.write_svg(lines, file=f)
+        return f.getvalue()
+
+    def get_png(self):
+        """Return png as bytes (it requires inkscape)."""
+        f = io.BytesIO()
+        self.write_png(file=f)
+        return f.getvalue()
+
+    def write_toolpath(self, lines=None, file=None):
+        lines = lines or self.lines
+        file = file or self.conf.fname + toolpath.EXT
+        toolpath.write(file, lines, self.conf)
+        self.conf._time('path:')
+
+    def load_toolpath(self, path):
+        """Set self.lines from ``toolpath.Toolpath`` object.
+
+        Output file names are from the toolpath file name
+        ('a.jpg.p2c' to 'a.jpg.nc' etc.).
+        """
+        self.toolpath = path
+        self.lines = path.lines
+        if path.fname.endswith(toolpath.EXT):
+            self.conf.fname = path.fname[:-len(toolpath.EXT)]
+        self.conf._time('load:')
+
+    def write_draft(self, lines=None, file=None):
+        lines = lines or self.lines
+        formatter = self.draft_formatter(self.conf, lines)
+        formatter.format(file)
+        self.conf._time('draft:')
+
+    def write_simulation(self):
+        from photo2cnccut import simulate  # requires numpy
+        sim = simulate.simulate(self)
+        self.conf._time('sim:')
+        if self.conf._quiet:
+            return
+        if getattr(self, '_im', None) is not None:  # not from toolpath
+            print('simulated tone error: %.1f' % sim.get_error(self._im))
+        if sim.rapid_cuts:
+            print('rapid moves below Z0: %d' % sim.rapid_cuts)
+
     def info(self, formatter):
-        if self.conf._args.quiet:
+        if self.conf._quiet:
             return
         # print('config version: %s' % self.conf._version)
         print('depth range: %s to %s' % formatter._get_depth_range())
@@ -140,6 +289,54 @@ class Data(object):
         return('\n'.join(ret))
 
 
+def open_image(image):
+    """Return PIL image from a file path, a file object, encoded bytes,
+    a PIL image (as is) or a NumPy array (``PIL.Image.fromarray``).
+    """
+    if isinstance(image, PIL.Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return PIL.Image.open(io.BytesIO(image))
+    if hasattr(image, '__array_interface__'):  # no need to import numpy
+        return PIL.Image.fromarray(image)
+    return PIL.Image.open(image)
+
+
+@contextlib.contextmanager
+def _open_output(file, fname, ext):
+    """Yield text write function for ``file``, or file ``fname + ext``."""
+    if file is None:
+        with open(fname + ext, 'w') as f:
+            yield f.write
+    elif isinstance(file, io.TextIOBase):
+        yield file.write
+    elif isinstance(file, (io.RawIOBase, io.BufferedIOBase)) or (
+            'b' in getattr(file, 'mode', '')):
+        yield lambda text: file.write(text.encode('utf-8'))
+    else:
+        yield file.write
+
+
+def format_time(seconds):
+    t = round(seconds)
+    if t < 60:
+        return '%d sec' % t
+    elif t < 3600:
+        return '%d min %d sec' % (t // 60, t % 60)
+    else:
+        m, s = t // 60, t % 60
+        return '%d h %d min %d sec' % (m // 60, m % 60, s)
+
+
+def make_intensity_table(func):
+    """Return lookup table of ``func`` for grayscale 0 to 255.
+
+    Use it for ``Data.intensity_table``,
+    when processing depends only on intensity values (e.g. gamma).
+    """
+    return [func(i) for i in range(256)]
+
+
 class Formatter(object):
     """base Formatter class."""
 
@@ -150,6 +347,76 @@ class Formatter(object):
     def _get_width(self, intensity):
         return self.conf.maxwidth * ((255 - intensity) / 255)
 
+    def _format_fixed(self, num, dot='.'):
+        """Format integer ``num`` in units of 10 ** -digit (fixed_point).
+
+        E.g. 1500 to '1.5', 2000 to '2.' (``dot`` is added to integers).
+        """
+        if num == 0:
+            return '0'
+        digit = self.conf.digit
+        sign = '-' if num < 0 else ''
+        i, f = divmod(abs(num), 10 ** digit)
+        if f == 0:
+            return sign + str(i) + dot
+        return sign + str(i) + '.' + ('%0*d' % (digit, f)).rstrip('0')
+
+    def _get_chunks(self):
+        """Split lines for processes.
+
+        Return lists of lines, links (relative to each chunk),
+        whether the first line is linked, and the next line's first point.
+        """
+        lines = self.lines
+        links = self._get_links()
+        num = max(1, self.conf.jobs or os.cpu_count() or 1) * 4
+        size = -(-len(lines) // num)  # ceil
+
+        chunks, chunk_links, linked, next_points = [], [], [], []
+        for start in range(0, len(lines), size):
+            end = min(start + size, len(lines))
+            chunks.append([list(line) for line in lines[start:end]])
+            chunk_links.append(
+                {i - start for i in links if start <= i < end})
+            linked.append(start - 1 in links)
+            next_points.append(lines[end][0] if end < len(lines) else None)
+        return chunks, chunk_links, linked, next_points
+
+    def _get_links(self):
+        """Return indexes of lines to link to the next lines.
+
+        Linked lines are joined with a feed move (see 'link_distance').
+        """
+        links = getattr(self, '_links', None)
+        if links is not None:
+            return links
+
+        links = set()
+        conf = self.conf
+        if conf.link_distance and conf.method == 'line' and (
+                not conf.cut_through):
+            lines = self.lines
+            for i in range(len(lines) - 1):
+                if self._is_linkable(lines[i][-1], lines[i + 1][0]):
+                    links.add(i)
+        self._links = links
+        return links
+
+    def _is_linkable(self, p1, p2):
+        distance = math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+        if distance > self.conf.link_distance * self.conf._scale:
+            return False
+        # the rectangle is convex, so the move stays on (or in) it
+        return self._is_on_border(p1) and self._is_on_border(p2)
+
+    def _is_on_border(self, point):
+        x, y = point[0], point[1]
+        scale = self.conf._scale
+        w, h = self.conf.width * scale, self.conf.height * scale
+        tolerance = 10 ** -self.conf.digit * scale
+        return (abs(x) < tolerance or abs(x - w) < tolerance
+            or abs(y) < tolerance or abs(y - h) < tolerance)
+
 
 class GFormatter(Formatter):
     """Create G-code string."""
@@ -157,11 +424,16 @@ class GFormatter(Formatter):
     def __init__(self, conf, lines):
         super().__init__(conf, lines)
         self._depth_cache = {}  # MEMO: 0.241s -> 0.055s
+        self._fixed_depth_cache = {}
 
         angle = (self.conf.tool_angle / 2) * (math.pi / 180)
         self.tool_tan = math.tan(angle)  # tool width / depth ratio
 
     def format(self):
+        if self.conf.jobs != 1 and len(self.lines) > 1:
+            yield from self._format_parallel()
+            return
+
         # using prev, just to avoid adding 'M1' to first and last lines.
         self.linenum = self.conf.line_number_increment
         prev = None
@@ -184,6 +456,63 @@ class GFormatter(Formatter):
         if self.conf.footer:
             yield from self._add_lines(self.conf.footer)
 
+    def _format_parallel(self):
+        """Format line chunks in processes, with the same output as serial.
+
+        Each chunk is formatted to unnumbered blocks,
+        start line numbers are from the sum of numbered blocks before,
+        and each chunk is numbered in processes again.
+        """
+        self.linenum = self.conf.line_number_increment
+        _add_num = self._add_line_number
+        cls, conf = type(self), self.conf
+
+        if self.conf.header:
+            yield from self._add_lines(self.conf.header)
+
+        head = [' '.join(b) for b in self._format_head()]
+        tail = [' '.join(b) for b in self._format_tail()]
+        chunks = self._get_chunks()
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.conf.jobs or None) as executor:
+            results = list(executor.map(_format_g_chunk,
+                itertools.repeat(cls), itertools.repeat(conf), *chunks))
+
+            yield _add_num(head[0])
+            yield '\n'
+            for block in head[1:]:
+                yield _add_num(block, m1=True)
+                yield '\n'
+
+            starts = []
+            for blocks, count, cache in results:
+                self._depth_cache.update(cache)
+                starts.append(self.linenum)
+                self.linenum += count * self.conf.line_number_increment
+            texts = executor.map(_number_g_chunk,
+                itertools.repeat(cls), itertools.repeat(conf),
+                [r[0] for r in results], starts)
+            yield from texts
+
+        for block in tail[:-1]:
+            yield _add_num(block, m1=True)
+            yield '\n'
+        _add_num(tail[-1], m1=True)  # discarded (as in serial, see prev)
+        yield _add_num(tail[-1])
+        yield '\n'
+
+        if self.conf.footer:
+            yield from self._add_lines(self.conf.footer)
+
+    def _count_line_numbers(self, blocks):
+        type_ = self.conf.line_number_type
+        if type_ == 'all':
+            return len(blocks)
+        if type_ == 'retract':
+            return sum(1 for b in blocks if b.startswith('G0 '))
+        return 0
+
     def _add_lines(self, lines):
         for line in lines.split('\n'):
             yield self._add_line_number(line)
@@ -209,25 +538,45 @@ class GFormatter(Formatter):
         return line
 
     def _format(self):
+        yield from self._format_head()
+        yield from self._format_lines(self.lines, self._get_links())
+        yield from self._format_tail()
+
+    def _format_head(self):
+        _f = self._format_number
+        yield ['G0', 'X0', 'Y0']
+        yield ['Z' + _f(self.conf.initial_z)]
+        yield ['Z' + _f(self.conf.retract_z)]
+
+    def _format_tail(self):
+        yield ['Z' + self._format_number(self.conf.initial_z)]
+
+    def _format_lines(self, lines, links, linked=False):
+        """Format ``lines``.
+
+        ``links`` are line indexes relative to ``lines``,
+        and ``linked`` is whether the first line is linked from before.
+        """
         _f = self._format_number
+        _get_depth = self._get_depth
+        if self.conf.fixed_point:
+            _f = self._format_fixed
+            _get_depth = self._get_fixed_depth
         _is_cut_through = self.conf.cut_through
         _is_point = (self.conf.method == 'point')
 
-        initial = 'Z' + _f(self.conf.initial_z)
-        retract = 'Z' + _f(self.conf.retract_z)
+        retract = 'Z' + self._format_number(self.conf.retract_z)
 
-        yield ['G0', 'X0', 'Y0']
-        yield [initial]
-        yield [retract]
-
-        for line in self.lines:
+        for i, line in enumerate(lines):
             first = True
             for point in line:
                 x, y, intensity = _f(point[0]), _f(point[1] * -1), point[2]
-                depth = _f(self._get_depth(intensity) * -1)
+                depth = _f(_get_depth(intensity) * -1)
                 if first:
                     first = False
-                    if _is_cut_through:
+                    if linked:
+                        yield ['X' + x, 'Y' + y, 'Z' + depth]
+                    elif _is_cut_through:
                         yield ['X' + x, 'Y' + y]
                         yield ['Z' + depth]
                         yield ['G1']
@@ -244,11 +593,10 @@ class GFormatter(Formatter):
                     else:
                         yield ['X' + x, 'Y' + y, 'Z' + depth]
 
-            if not _is_cut_through:
+            linked = i in links
+            if not _is_cut_through and not linked:
                 yield ['G0', retract]
 
-        yield [initial]
-
     def _format_number(self, num):  # number to string
         if num == 0:
             return '0'  # 0, -0, 0., 0.0 -> '0'
@@ -270,6 +618,15 @@ class GFormatter(Formatter):
             cache[intensity] = depth
             return cache[intensity]
 
+    def _get_fixed_depth(self, intensity):  # fixed_point
+        cache = self._fixed_depth_cache
+        try:
+            return cache[intensity]
+        except KeyError:
+            depth = round(self._get_depth(intensity) * self.conf._scale)
+            cache[intensity] = depth
+            return depth
+
     # get actual min and max depth from cache
     def _get_depth_range(self):
         min_ = self._depth_cache[max(self._depth_cache)] * -1 or 0
@@ -278,28 +635,92 @@ class GFormatter(Formatter):
 
     # estimate cut time (plunge + feed, omit rapid moves)
     def _estimate(self):
+        return format_time(self._estimate_seconds())
+
+    def _estimate_seconds(self):
         retract = self.conf.retract_z
         _get_depth = lambda x: abs(self._get_depth(x))
         points = (point for line in self.lines for point in line)
 
         if self.conf.method == 'line':
+            links = self._get_links()
             x = sum(abs(line[0][0] - line[-1][0]) for line in self.lines)
-            xy = x / self.conf.cos
-            z_above = retract * len(self.lines)
+            xy = x / self.conf.cos + self._get_link_length(links)
+            xy = xy / self.conf._scale
+            z_above = retract * (len(self.lines) - len(links))
             z_below = sum(_get_depth(point[2]) for point in points)
             distance = z_above + math.hypot(xy, z_below)
         else:
             distance = sum(retract + _get_depth(point[2]) for point in points)
 
-        t = round(distance / self.conf.feed * 60)
+        return distance / self.conf.feed * 60
+
+    def _get_link_length(self, links):
+        lines = self.lines
+        length = 0
+        for i in links:
+            p1, p2 = lines[i][-1], lines[i + 1][0]
+            length += math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+        return length
 
-        if t < 60:
-            return '%d sec' % t
-        elif t < 3600:
-            return '%d min %d sec' % (t // 60, t % 60)
-        else:
-            m, s = t // 60, t % 60
-            return '%d h %d min %d sec' % (m // 60, m % 60, s)
+
+def _format_g_chunk(cls, conf, lines, links, linked, next_point):
+    formatter = cls(conf, lines)
+    blocks = [' '.join(b) for b in formatter._format_lines(
+        lines, links, linked)]
+    count = formatter._count_line_numbers(blocks)
+    return blocks, count, formatter._depth_cache
+
+
+def _number_g_chunk(cls, conf, blocks, linenum):
+    formatter = cls(conf, [])
+    formatter.linenum = linenum
+    _add_num = formatter._add_line_number
+    return ''.join(_add_num(block, m1=True) + '\n' for block in blocks)
+
+
+def _format_svg_chunk(cls, conf, id_prefix, lines, links, linked,
+        next_point):
+    formatter = cls(conf, lines)
+    formatter.id_prefix = id_prefix
+    return ''.join(formatter._format_lines(lines, links, next_point))
+
+
+_GCODE_COMMENT = re.compile(r'\([^)]*\)|;.*')
+
+
+def parse_gcode(lines, start=(0, 0, 0)):
+    """Parse g-code lines, and yield ``(g, x, y, z)`` for each move.
+
+    It reads what ``GFormatter`` writes (N, G0, G1, X, Y, Z, M1),
+    modal codes are carried over, and other codes are ignored.
+    ``g`` is 0 (rapid) or 1 (feed).
+    Blocks without any coordinate (e.g. 'G1' alone) yield nothing.
+    """
+    g = 0
+    x, y, z = start
+    for line in lines:
+        if '(' in line or ';' in line:
+            line = _GCODE_COMMENT.sub(' ', line)
+        moved = False
+        for word in line.split():
+            c = word[0]
+            if c == 'X':
+                x = float(word[1:])
+                moved = True
+            elif c == 'Y':
+                y = float(word[1:])
+                moved = True
+            elif c == 'Z':
+                z = float(word[1:])
+                moved = True
+            elif c == 'G':
+                if word in ('G0', 'G00'):
+                    g = 0
+                elif word in ('G1', 'G01'):
+                    g = 1
+        if moved:
+            yield g, x, y, z
 
 
 class SVGFormatter(Formatter):
@@ -314,6 +735,8 @@ class SVGFormatter(Formatter):
         </svg>
     """
 
+    id_prefix = 'p'  # of point circle ids (svg_point: use)
+
     def __init__(self, conf, lines):
         super().__init__(conf, lines)
         self._inc_cache = {}  # MEMO: 0.105s -> 0.061s
@@ -323,12 +746,46 @@ class SVGFormatter(Formatter):
 
         yield self._get_beginning()
         yield '\n'
-        for line in self.lines:
-            if _is_point:
+        if _is_point and self.conf.svg_point == 'path':
+            yield ''.join(self._format_level_paths())
+        else:
+            if _is_point and self.conf.svg_point == 'use':
+                yield ''.join(self._format_defs())
+            if self.conf.jobs != 1 and len(self.lines) > 1:
+                yield from self._format_parallel()
+            else:
+                yield from self._format_lines(self.lines, self._get_links())
+        yield self._get_ending()
+
+    def _format_parallel(self):
+        chunks = self._get_chunks()
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.conf.jobs or None) as executor:
+            yield from executor.map(_format_svg_chunk,
+                itertools.repeat(type(self)), itertools.repeat(self.conf),
+                itertools.repeat(self.id_prefix), *chunks)
+
+    def _format_lines(self, lines, links, next_point=None):
+        """Format ``lines``.
+
+        ``links`` are line indexes relative to ``lines``,
+        and ``next_point`` is the first point after them (for the last link).
+        """
+        _is_point = (self.conf.method == 'point')
+        _is_use = _is_point and self.conf.svg_point == 'use'
+        for i, line in enumerate(lines):
+            if _is_use:
+                yield ''.join(self._format_use(line))
+            elif _is_point:
                 yield ''.join(self._format_circle(line))
             else:
                 yield ''.join(self._format_path(line))
-        yield self._get_ending()
+                if i in links:
+                    if i + 1 < len(lines):
+                        link = line[-1], lines[i + 1][0]
+                    else:
+                        link = line[-1], next_point
+                    yield ''.join(self._format_path(link))
 
     def _get_beginning(self):
         text = textwrap.dedent(self.beginning.lstrip('\n').rstrip())
@@ -347,19 +804,88 @@ class SVGFormatter(Formatter):
         text = textwrap.dedent(self.ending.lstrip('\n').rstrip())
         return text
 
+    def _format_coord(self, x):
+        if self.conf.fixed_point:
+            return self._format_fixed(x, dot='')
+        return self.conf._round(x)
+
     def _format_circle(self, line):  # method: point
+        _c = self._format_coord
         for point in line:
             x, y, intensity = point
-            x, y = self.conf._round(x), self.conf._round(y)
+            x, y = _c(x), _c(y)
             radius = self._get_width(intensity) / 2
             yield '<circle cx="%s" cy="%s" r="%s"/>' % (x, y, radius)
             yield '\n'
 
+    def _get_level(self, intensity):
+        level = int(round(intensity))
+        return min(max(level, 0), 255)
+
+    def _get_level_radius(self, level):
+        return self.conf._round(self._get_width(level) / 2)
+
+    def _get_levels(self):
+        _get_level = self._get_level
+        levels = set()
+        for line in self.lines:
+            levels.update(_get_level(point[2]) for point in line)
+        return sorted(levels)
+
+    def _format_defs(self):  # method: point, svg_point: use
+        yield '<defs>\n'
+        for level in self._get_levels():
+            radius = self._get_level_radius(level)
+            if radius:
+                yield '<circle id="%s%d" r="%s"/>\n' % (
+                    self.id_prefix, level, radius)
+        yield '</defs>\n'
+
+    def _format_use(self, line):  # method: point, svg_point: use
+        _round = self._format_coord
+        _get_level = self._get_level
+        id_prefix = self.id_prefix
+        radii = {}  # level: radius (no circle is defined for 0)
+        for point in line:
+            x, y, intensity = point
+            level = _get_level(intensity)
+            radius = radii.get(level)
+            if radius is None:
+                radius = radii[level] = self._get_level_radius(level)
+            if not radius:
+                continue
+            yield '<use href="#%s%d" x="%s" y="%s"/>\n' % (
+                id_prefix, level, _round(x), _round(y))
+
+    def _format_level_paths(self):  # method: point, svg_point: path
+        _round = self._format_coord
+        _get_level = self._get_level
+        levels = {}
+        for line in self.lines:
+            for point in line:
+                x, y, intensity = point
+                level = _get_level(intensity)
+                if level == 255:
+                    continue
+                subpath = 'M%s %sh0' % (_round(x), _round(y))
+                levels.setdefault(level, []).append(subpath)
+
+        color = self.conf.svg_color
+        for level in sorted(levels):
+            width = self.conf._round(self._get_level_radius(level) * 2)
+            if not width:
+                continue
+            yield ('<path stroke="%s" stroke-width="%s" '
+                'stroke-linecap="round" fill="none" d="' % (color, width))
+            yield ''.join(levels[level])
+            yield '"/>\n'
+
     def _format_path(self, line):  # method: line
         first = True
+        _c = self._format_coord
         for point in self._build_points(line):
             x, y = point
-            x, y = self.conf._round(x), self.conf._round(y)
+            x, y = _c(x), _c(y)
             if first:
                 first = False
                 yield '<path d="M '
@@ -393,6 +919,9 @@ class SVGFormatter(Formatter):
             radius = self._get_width(intensity) / 2
             xi = radius * self.conf.sin
             yi = radius * self.conf.cos
+            if self.conf.fixed_point:
+                scale = self.conf._scale
+                xi, yi = round(xi * scale), round(yi * scale)
             cache[intensity] = xi, yi
             return cache[intensity]
 
@@ -403,6 +932,14 @@ def svg2png(width, height, infile, outfile):
     subprocess.run(cmd)
 
 
+def svg2png_bytes(width, height, svg):
+    """Convert svg bytes to png bytes through pipes (no files)."""
+    cmd = ['inkscape', '-w', str(width), '-h', str(height), '--pipe',
+            '--export-type', 'png', '--export-filename', '-']
+    proc = subprocess.run(cmd, input=svg, stdout=subprocess.PIPE, check=True)
+    return proc.stdout
+
+
 class PNGFormatter(Formatter):
     """Create PNG file. Use inkscape."""
 
@@ -416,7 +953,49 @@ class PNGFormatter(Formatter):
             msg = 'png formatting needs svg file: %s' % infile
             raise FileNotFoundError(msg)
 
+        svg2png(*self._get_size(), infile, outfile)
+
+    def convert(self, svg):
+        """Return png bytes from svg bytes."""
+        return svg2png_bytes(*self._get_size(), svg)
+
+    def _get_size(self):
         scale = self.conf.svg_scale * self.conf.png_scale
         width = int(self.conf.width * scale)
         height = int(self.conf.height * scale)
-        svg2png(width, height, infile, outfile)
+        return width, height
+
+
+class DraftFormatter(SVGFormatter):
+    """Create low resolution PNG file straight from lines. Use PIL."""
+
+    def format(self, file=None):
+        size = self._get_size()
+        size = round(size[0]) or 1, round(size[1]) or 1
+        scale = self.conf.svg_scale / self.conf._scale  # for coordinates
+        color = self.conf.svg_color
+        im = PIL.Image.new('RGB', size, self.conf.svg_background)
+        draw = PIL.ImageDraw.Draw(im)
+
+        if self.conf.method == 'point':
+            for line in self.lines:
+                for x, y, intensity in line:
+                    r = self._get_width(intensity) / 2 * self.conf.svg_scale
+                    x, y = x * scale, y * scale
+                    if r > 0:
+                        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+        else:
+            # draw each section (between two points), skipping uncut ones
+            links = self._get_links()
+            for i, line in enumerate(self.lines):
+                if i - 1 in links:
+                    line = [self.lines[i - 1][-1]] + list(line)
+                prev = prev_apexes = None
+                for point in line:
+                    apexes = [(x * scale, y * scale)
+                        for x, y in self._get_apexes(point)]
+                    if prev and (prev[2] < 255 or point[2] < 255):
+                        draw.polygon(prev_apexes + apexes[::-1], fill=color)
+                    prev, prev_apexes = point, apexes
+
+        im.save(file or self.conf.fname + '.draft.png', format='PNG')
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""Fit stepover and resolution to a cut time budget (and g-code size).
+
+Candidates are compared by the pre-flight estimate
+(see ``photo2cnccut.preflight``), without building lines.
+"""
+
+import re
+
+from photo2cnccut import base, preflight
+
+# scale factors of config values to try
+STEPOVER_SCALES = [2 ** (i / 8) for i in range(-8, 25)]  # 0.5 to 8
+RESOLUTION_SCALES = [2 ** (i / 4) for i in range(-4, 13)]  # 0.5 to 8
+
+_UNITS = {'h': 3600, 'm': 60, 'min': 60, 's': 1, 'sec': 1}
+_SIZE_UNITS = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}
+
+
+def parse_time(text):
+    """Parse time text (e.g. '1h30m', '90min', '45s') to seconds.
+
+    A plain number is minutes.
+    """
+    text = text.replace(' ', '').lower()
+    try:
+        return float(text) * 60
+    except ValueError:
+        pass
+    items = re.findall(r'([\d.]+)(h|min|m|sec|s)', text)
+    if not items or ''.join(n + u for n, u in items) != text:
+        raise ValueError('Invalid time: %r' % text)
+    return sum(float(n) * _UNITS[u] for n, u in items)
+
+
+def parse_size(text):
+    """Parse size text (e.g. '500k', '2M', '1000000') to bytes."""
+    m = re.fullmatch(r'([\d.]+)([kmg]?)b?', text.replace(' ', '').lower())
+    if not m:
+        raise ValueError('Invalid size: %r' % text)
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2)])
+
+
+def fit(data, seconds=None, size=None):
+    """Search 'stepover' and 'resolution' for ``seconds`` (and ``size``).
+
+    Among candidates in the budget, the one with the smallest stepover
+    (cut time is mostly from it), and then the most points is chosen.
+    If none is, the fastest one is chosen.
+
+    Update ``data.conf``, and return ``Estimate`` of it.
+    """
+    conf = data.conf
+    histogram = preflight.get_histogram(data.pixels)
+    levels = data.process_intensities(list(range(256)))
+
+    candidates = []
+    for s in STEPOVER_SCALES:
+        for r in RESOLUTION_SCALES:
+            config = {
+                'stepover': conf._round(conf.stepover * s),
+                'resolution': conf._round(conf.resolution * r),
+            }
+            if not config['stepover'] or not config['resolution']:
+                continue
+            estimate = preflight.Estimate(preflight.copy_conf(conf, config),
+                histogram, levels, data.g_formatter)
+            candidates.append((config, estimate))
+
+    def is_in_budget(estimate):
+        if seconds is not None and estimate.seconds > seconds:
+            return False
+        return size is None or estimate.size <= size
+
+    fits = [c for c in candidates if is_in_budget(c[1])]
+    if fits:
+        config, estimate = max(fits, key=lambda c: (
+            -c[0]['stepover'], c[1].points))
+    else:
+        config, estimate = min(candidates, key=lambda c: c[1].seconds)
+
+    for k, v in config.items():
+        setattr(conf, k, v)
+    return estimate
+
+
+def format_report(estimate, seconds=None, size=None):
+    conf = estimate.conf
+    ret = [
+        'budget stepover: %s' % conf.stepover,
+        'budget resolution: %s' % conf.resolution,
+    ]
+    time = base.format_time(estimate.seconds)
+    if seconds is not None:
+        time += ' (budget %s%s)' % (base.format_time(seconds),
+            ', over' if estimate.seconds > seconds else '')
+    ret.append('predicted cut time: %s' % time)
+    if size is not None:
+        ret.append('predicted g-code size: %d (budget %d%s)' % (
+            estimate.size, size, ', over' if estimate.size > size else ''))
+    return '\n'.join(ret)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""Compare two g-code (or svg) outputs semantically.
+
+Formatting differences ('2.' and '2.0', line numbers, block splitting
+without moves) are ignored, and numbers are compared with tolerances.
+Files are read in a stream, so large programs use little memory.
+
+g-code is compared per move (``base.parse_gcode`` output),
+omitting moves to the same position.
+svg is compared per drawing element (path, circle, use),
+path data by command letters and numbers (not separators),
+and radii and stroke widths (point sizes) are reported as z deviation.
+"""
+
+import argparse
+import itertools
+import math
+import re
+import sys
+import xml.etree.ElementTree
+
+from photo2cnccut import base
+
+TOLERANCE = 0.0011  # a little more than 'digit' 3 rounding
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_NON_COMMAND = re.compile(r'[^A-Za-z]')
+
+
+class Difference(object):
+    """First divergence (``index`` is move or element number from 0)."""
+
+    def __init__(self, index, lines, items, message):
+        self.index = index
+        self.lines = lines  # line numbers in the files (from 1)
+        self.items = items
+        self.message = message
+
+    def __str__(self):
+        ret = ['first difference at #%d: %s' % (self.index, self.message)]
+        for num, item in zip(self.lines, self.items):
+            ret.append('    line %s: %s' % (num, item))
+        return '\n'.join(ret)
+
+
+class Result(object):
+    """Comparison result."""
+
+    def __init__(self):
+        self.count = 0  # moves or elements compared
+        self.first = None  # Difference
+        self.max_xy = 0.0
+        self.max_z = 0.0
+
+    @property
+    def equal(self):
+        return self.first is None
+
+    def __bool__(self):
+        return self.equal
+
+    def __str__(self):
+        ret = []
+        if self.first:
+            ret.append(str(self.first))
+        else:
+            ret.append('equivalent (%d compared)' % self.count)
+        ret.append('max xy deviation: %s' % self.max_xy)
+        ret.append('max z deviation: %s' % self.max_z)
+        return '\n'.join(ret)
+
+    def _set_first(self, index, lines, items, message):
+        if self.first is None:
+            self.first = Difference(index, lines, items, message)
+
+
+class _LineCounter(object):
+    """Iterate lines, keeping the current line number."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.num = 0
+
+    def __iter__(self):
+        num = 0
+        for num, line in enumerate(self._lines, 1):
+            self.num = num
+            yield line
+
+
+def _iter_moves(lines):
+    """Yield ``(line number, move)``, omitting moves to the same position."""
+    counter = _LineCounter(lines)
+    prev = None
+    for move in base.parse_gcode(counter):
+        position = move[1:]
+        if position != prev:
+            prev = position
+            yield counter.num, move
+
+
+def compare_gcode(lines1, lines2,
+        xy_tolerance=TOLERANCE, z_tolerance=TOLERANCE):
+    """Compare two g-code line iterables (e.g. file objects)."""
+    result = Result()
+    max_xy2, max_z = 0.0, 0.0  # squared xy
+    xy_tolerance2 = xy_tolerance * xy_tolerance
+    i = -1
+    moves = itertools.zip_longest(_iter_moves(lines1), _iter_moves(lines2))
+    for i, (m1, m2) in enumerate(moves):
+        if m1 is None or m2 is None:
+            num = 1 if m1 is None else 2
+            result._set_first(i, (m1 and m1[0], m2 and m2[0]),
+                (m1 and m1[1], m2 and m2[1]), 'file %d ends' % num)
+            break
+        (g1, x1, y1, z1), (g2, x2, y2, z2) = m1[1], m2[1]
+        dx, dy, z = x1 - x2, y1 - y2, abs(z1 - z2)
+        xy2 = dx * dx + dy * dy
+        if xy2 > max_xy2:
+            max_xy2 = xy2
+        if z > max_z:
+            max_z = z
+        if g1 != g2 or xy2 > xy_tolerance2 or z > z_tolerance:
+            if result.first is None:
+                if g1 != g2:
+                    message = 'G%d and G%d' % (g1, g2)
+                elif xy2 > xy_tolerance2:
+                    message = 'xy deviation %s' % math.sqrt(xy2)
+                else:
+                    message = 'z deviation %s' % z
+                result._set_first(
+                    i, (m1[0], m2[0]), (m1[1], m2[1]), message)
+    else:
+        i += 1
+    result.count = i
+    result.max_xy = math.sqrt(max_xy2)
+    result.max_z = max_z
+    return result
+
+
+def _iter_elements(fname):
+    """Yield ``(line number, (tag, text, xy numbers, z numbers))``.
+
+    Only svg drawing elements (path, circle, use) are yielded.
+    """
+    parser = xml.etree.ElementTree.XMLPullParser(events=('end',))
+    with open(fname) as f:
+        for num, line in enumerate(f, 1):
+            parser.feed(line)
+            for _, elem in parser.read_events():
+                item = _get_element(elem)
+                elem.clear()
+                if item:
+                    yield num, item
+    parser.close()
+
+
+def _get_element(elem):
+    tag = elem.tag.rpartition('}')[2]
+    get = elem.get
+    if tag == 'path':
+        d = get('d', '')
+        xy = [float(n) for n in _NUMBER.findall(d)]
+        commands = _NON_COMMAND.sub('', _NUMBER.sub(' ', d))
+        z = [float(get('stroke-width'))] if get('stroke-width') else []
+        return tag, commands, xy, z
+    if tag == 'circle':
+        xy = [float(get(k, 0)) for k in ('cx', 'cy')]
+        return tag, get('id', ''), xy, [float(get('r', 0))]
+    if tag == 'use':
+        xy = [float(get(k, 0)) for k in ('x', 'y')]
+        return tag, get('href', ''), xy, []
+    return None
+
+
+def compare_svg(fname1, fname2,
+        xy_tolerance=TOLERANCE, z_tolerance=TOLERANCE):
+    """Compare two svg files (radii and stroke widths are compared as z)."""
+    result = Result()
+    elements = itertools.zip_longest(
+        _iter_elements(fname1), _iter_elements(fname2))
+    for i, (e1, e2) in enumerate(elements):
+        if e1 is None or e2 is None:
+            num = 1 if e1 is None else 2
+            result._set_first(i, (e1 and e1[0], e2 and e2[0]),
+                (e1 and e1[1][:2], e2 and e2[1][:2]), 'file %d ends' % num)
+            break
+        (n1, (tag1, text1, xy1, z1)), (n2, (tag2, text2, xy2, z2)) = e1, e2
+        result.count += 1
+        message = None
+        if (tag1, text1, len(xy1), len(z1)) != (
+                tag2, text2, len(xy2), len(z2)):
+            message = 'different elements'
+        else:
+            xy = max((abs(a - b) for a, b in zip(xy1, xy2)), default=0)
+            z = max((abs(a - b) for a, b in zip(z1, z2)), default=0)
+            result.max_xy = max(result.max_xy, xy)
+            result.max_z = max(result.max_z, z)
+            if xy > xy_tolerance:
+                message = 'xy deviation %s' % xy
+            elif z > z_tolerance:
+                message = 'z deviation %s' % z
+        if message:
+            result._set_first(i, (n1, n2), (e1[1][:2], e2[1][:2]), message)
+    return result
+
+
+def compare_files(fname1, fname2,
+        xy_tolerance=TOLERANCE, z_tolerance=TOLERANCE):
+    """Compare two '.nc' or '.svg' files."""
+    if fname1.endswith('.svg'):
+        return compare_svg(fname1, fname2, xy_tolerance, z_tolerance)
+    with open(fname1) as f:
+        with open(fname2) as g:
+            return compare_gcode(f, g, xy_tolerance, z_tolerance)
+
+
+def _build_args(args):
+    parser = argparse.ArgumentParser(
+        description='Compare two g-code (or svg) files semantically.')
+    parser.add_argument('fname1')
+    parser.add_argument('fname2')
+
+    h = 'xy tolerance (default: %s)' % TOLERANCE
+    parser.add_argument('--xy', type=float, default=TOLERANCE, help=h)
+
+    h = 'z (and radius) tolerance (default: %s)' % TOLERANCE
+    parser.add_argument('--z', type=float, default=TOLERANCE, help=h)
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Print the result, and return 0 if equivalent, 1 if not."""
+    args = _build_args(args if args is not None else sys.argv[1:])
+    result = compare_files(args.fname1, args.fname2, args.xy, args.z)
+    print(result)
+    return 0 if result.equal else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
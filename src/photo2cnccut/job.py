@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""Run conversions as independent jobs (e.g. on threads).
+
+User files (``p2cconfig.py`` and ``p2cmodule.py``) are loaded
+from their file paths, without changing ``sys.path``,
+and cached by path and modification time,
+so directories with the same file names don't collide.
+
+All state of a conversion is on its ``Job`` (and its ``Data``),
+and outputs are returned as bytes (nothing is written).
+Pillow and NumPy stages (decoding, conversion and resizing)
+release the GIL, so they run concurrently on threads.
+Building lines is pure Python, and it does not.
+"""
+
+import concurrent.futures
+import hashlib
+import importlib.util
+import io
+import os
+import sys
+import threading
+
+from photo2cnccut import ui
+
+_MODULES = {}  # path: (mtime, module)
+_LOCK = threading.Lock()
+
+OUTPUTS = ('gcode', 'svg')
+
+
+def load_python_object(path, objname):
+    """Return ``objname`` in python file ``path`` (or ``None``).
+
+    The module is executed again only when the file is modified.
+    Import errors in it are raised (with the file path).
+    """
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+
+    with _LOCK:
+        cached = _MODULES.get(path)
+        if cached and cached[0] == mtime:
+            module = cached[1]
+        else:
+            module = _load_module(path)
+            _MODULES[path] = mtime, module
+    return getattr(module, objname, None)
+
+
+def _load_module(path):
+    # unique name per path, registered for pickle (e.g. process pools)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    name = '%s_%s' % (os.path.basename(path)[:-3], digest)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        # e.g. importing other files in the directory (not in sys.path)
+        raise ImportError('%s: %s' % (path, e)) from e
+    sys.modules[name] = module
+    return module
+
+
+def load_user_files(fname):
+    """Return user config (a copy) and Data class for picture ``fname``."""
+    directory = os.path.dirname(fname)
+    config = load_python_object(
+        os.path.join(directory, ui.CONFIG_FILENAME),
+        ui.CONFIG_DICTIONARY_NAME)
+    data_class = load_python_object(
+        os.path.join(directory, ui.DATA_FILENAME), ui.DATA_CLASS_NAME)
+    if config is not None:
+        config = dict(config)
+    return config, data_class
+
+
+class Job(object):
+    """One conversion.
+
+    ``image`` is a file path, or in-memory image (see ``base.open_image``).
+    ``fname`` is the picture file path for user files and the mask
+    (default: ``image`` if it is a path).
+    ``config`` updates the user config.
+    ``outputs`` are some of 'gcode', 'svg', 'png', 'draft' and 'toolpath'.
+    """
+
+    def __init__(self, image, config=None, fname=None, outputs=OUTPUTS,
+            data_class=None, conf=None, user_files=True, quiet=True):
+        self.image = image
+        if fname is None and isinstance(image, str):
+            fname = image
+        self.fname = fname
+        self.config = config or {}
+        self.outputs = outputs
+        self.data_class = data_class
+        self.conf = conf
+        self.user_files = user_files
+        self.quiet = quiet
+
+        self.data = None
+        self.results = None
+
+    def run(self):
+        """Build and return outputs (a dictionary of names and bytes)."""
+        config, data_class = {}, None
+        if self.user_files and self.fname:
+            config, data_class = load_user_files(self.fname)
+        config = dict(config or {}, **self.config)
+        data_class = self.data_class or data_class
+        if data_class is None:
+            import photo2cnccut.line
+            data_class = photo2cnccut.line.Data
+
+        data = data_class(config=config, conf=self.conf)
+        data.conf.fname = self.fname
+        data.conf._quiet = self.quiet
+        self.data = data
+
+        data.build(image=self.image)
+        self.results = {name: self.get_output(name) for name in self.outputs}
+        return self.results
+
+    def get_output(self, name):
+        data = self.data
+        if name == 'gcode':
+            return data.get_gcode()
+        if name == 'svg':
+            return data.get_svg()
+        if name == 'png':
+            return data.get_png()
+        f = io.BytesIO()
+        if name == 'draft':
+            data.write_draft(file=f)
+        elif name == 'toolpath':
+            data.write_toolpath(file=f)
+        else:
+            raise ValueError('Unknown output: %r' % name)
+        return f.getvalue()
+
+
+def run_jobs(jobs, workers=None):
+    """Run jobs on a thread pool, and return their outputs in order."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(Job.run, jobs))
@@ -2,16 +2,53 @@
 
 """Generate line cut (black to cut depth)."""
 
-from photo2cnccut import base
+import collections
+import hashlib
+import math
+import os
+import tempfile
+import threading
+
+from photo2cnccut import base, toolpath
 
 
 class Data(base.Data):
     """Process line or point method data."""
 
     def build_lines(self, pointer=None):
+        # process intensities later per line, unless per point is required
+        _is_processed = self._is_overridden('get_intensity')
+
+        if pointer is None and not _is_processed:
+            plan = self.get_plan()
+            lines = plan.get_lines(plan.gather(self.pixels))
+        else:
+            scale = self.conf._scale
+            if _is_processed:
+                get_intensity = self.get_intensity
+            else:
+                pixels = self.pixels
+                get_intensity = lambda x, y: self._get_intensity(
+                    x, y, pixels)
+            lines = []
+            for line in self.walk(pointer):
+                lines.append([[x, y, get_intensity(x / scale, y / scale)]
+                    for x, y in line])
+
+        lines = self.process_lines(lines, _is_processed)
+        if self.mask_pixels is not None:
+            lines = self.apply_mask(lines)
+        if self.conf.skip_blank:
+            lines = self.split_blank(lines)
+        self.lines = lines
 
-        pointer = pointer or Pointer
+    def walk(self, pointer=None):
+        """Return lists of point positions ``(x, y)`` per line."""
+        pointer = pointer or (
+            FixedPointer if self.conf.fixed_point else Pointer)
         self.pointer = pointer(self.conf)
+        scale = self.conf._scale
+        _round = self.conf._round
 
         _is_point = (self.conf.method == 'point')
 
@@ -34,14 +71,226 @@ class Data(base.Data):
                 if line:
                     lines.append(line)
                 line = []
-            x, y = self.conf._round(x), self.conf._round(y)
-            intensity = self.get_intensity(x, y)
+            if scale == 1:
+                x, y = _round(x), _round(y)
+            line.append((x, y))
+        return lines
+
+    def get_plan(self):
+        """Return ``Plan`` for the current config and image size.
+
+        Recently used plans are cached in memory (``PLAN_CACHE_SIZE``),
+        and in 'plan_cache' directory if it is set.
+        Plans are built one at a time (threads wait and share them).
+        """
+        key = self._get_plan_key()
+        with _PLANS_LOCK:
+            return self._get_plan(key)
+
+    def _get_plan(self, key):
+        plan = _PLANS.get(key)
+        if plan is not None:
+            _PLANS.move_to_end(key)
+        else:
+            directory = self.conf.plan_cache
+            fname = None
+            if directory:
+                digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+                fname = os.path.join(directory, digest + toolpath.EXT)
+                if os.path.isfile(fname):
+                    plan = Plan.load(fname, key)
+            if plan is None:
+                plan = Plan.build(self, key)
+                if fname:
+                    os.makedirs(directory, exist_ok=True)
+                    plan.save(fname)
+            _PLANS[key] = plan
+            while len(_PLANS) > PLAN_CACHE_SIZE:
+                _PLANS.popitem(last=False)
+        return plan
+
+    def _get_plan_key(self):
+        conf = self.conf
+        names = ('width', 'height', 'line_angle', 'resolution', 'stepover',
+            'maxwidth', 'digit', 'fixed_point', 'method')
+        values = tuple(getattr(conf, name) for name in names)
+        cls = type(self)
+        return (cls.__module__, cls.__qualname__) + values + (
+            self._im.width, len(self.pixels))
+
+    def process_lines(self, lines, is_processed=False):
+        """Process intensities per line, and omit ``None`` points."""
+        ret = []
+        for line in lines:
+            if not is_processed:
+                intensities = [point[2] for point in line]
+                intensities = self.process_intensities(intensities)
+                for point, intensity in zip(line, intensities):
+                    point[2] = intensity
             # TODO: Which is best, None, math.nan or -99999?
-            if intensity is None:
+            line = [point for point in line if point[2] is not None]
+            if line:
+                ret.append(line)
+        return ret
+
+    def apply_mask(self, lines):
+        """Set intensity to 255 (no cut) where mask is dark."""
+        scale = self.conf._scale
+        mask = self.mask_pixels
+        for line in lines:
+            for point in line:
+                x, y = point[0] / scale, point[1] / scale
+                if self._get_intensity(x, y, mask) < 128:
+                    point[2] = 255
+        return lines
+
+    def split_blank(self, lines):
+        """Split lines at blank (not cut) spans, see 'skip_blank'.
+
+        Line method keeps one blank point on each side of a cut segment,
+        for the tool to rise to Z0 as usual.
+        Point method just omits blank points.
+        """
+        threshold = self.conf.blank_threshold
+        ret = []
+        for line in lines:
+            if self.conf.method == 'point':
+                line = [point for point in line if point[2] < threshold]
+                if line:
+                    ret.append(line)
                 continue
-            line.append([x, y, intensity])
 
-        self.lines = lines
+            blank = [point[2] >= threshold for point in line]
+            for segment in self._split_blank(line, blank):
+                if not all(blank[segment]):
+                    ret.append(line[segment])
+        return ret
+
+    def _split_blank(self, line, blank):
+        min_gap = self.conf.blank_min_gap * self.conf._scale
+        num = len(line)
+        start = 0
+        i = 0
+        while i < num:
+            if not blank[i]:
+                i += 1
+                continue
+            j = i  # blank span is from i to j
+            while j + 1 < num and blank[j + 1]:
+                j += 1
+            p1, p2 = line[i], line[j]
+            if math.hypot(p2[0] - p1[0], p2[1] - p1[1]) >= min_gap:
+                if i > 0:
+                    yield slice(start, i + 1)
+                start = j
+            i = j + 1
+        if start == 0 or start < num - 1:
+            yield slice(start, num)
+
+    def coarsen(self, points):
+        conf = self.conf
+        scale = (self.get_point_count() / points) ** 0.5
+        if scale <= 1:
+            return {}
+
+        changes = {}
+        for name in ('resolution', 'maxwidth'):
+            old = getattr(conf, name)
+            new = conf._round(old * scale)
+            setattr(conf, name, new)
+            changes[name] = old, new
+        return changes
+
+    def get_point_count(self):
+        """Estimate the number of points (without building lines)."""
+        conf = self.conf
+        distance = conf.maxwidth * conf.stepover  # between lines
+        area = conf.width * conf.height
+        return area * conf.cos / (distance * conf.resolution)
+
+
+class Plan(object):
+    """Point positions, and source pixel indexes for an image size.
+
+    Positions depend only on geometry config (not on pixel values),
+    so pictures of the same layout can share a plan,
+    only gathering pixels by the indexes.
+    """
+
+    def __init__(self, key, lines, indexes):
+        self.key = key
+        self.lines = lines  # lists of (x, y) per line
+        self.indexes = indexes  # lists of pixel indexes per line
+        self.outside = key[-1]  # index for points outside of pixels
+
+    @classmethod
+    def build(cls, data, key):
+        lines = data.walk()
+        scale = data.conf._scale
+        img_width = data._im.width
+        img_scale = img_width / data.conf.width
+        pixels = data.pixels
+        num = key[-1]
+
+        indexes = []
+        for line in lines:
+            line_indexes = []
+            for x, y in line:
+                # see base.Data._get_intensity
+                x, y = x / scale, y / scale
+                x, y = round(x * img_scale), round(y * img_scale)
+                index = x + (y - 1) * img_width - 1
+                try:
+                    pixels[index]  # range check is the same as the pixels'
+                except IndexError:
+                    index = num
+                line_indexes.append(index)
+            indexes.append(line_indexes)
+        return cls(key, lines, indexes)
+
+    @classmethod
+    def load(cls, fname, key):
+        with toolpath.Toolpath(fname) as path:
+            if path.config.get('key') != repr(key):
+                return None
+            lines, indexes = [], []
+            for line in path.lines:
+                line = list(line)
+                lines.append([(x, y) for x, y, _ in line])
+                indexes.append([index for _, _, index in line])
+        return cls(key, lines, indexes)
+
+    def save(self, fname):
+        lines = ([(x, y, index) for (x, y), index in zip(line, indexes)]
+            for line, indexes in zip(self.lines, self.indexes))
+        # unique per process and thread, then renamed (atomic)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp',
+            prefix=os.path.basename(fname) + '.', dir=os.path.dirname(fname))
+        os.close(fd)
+        try:
+            toolpath.write(tmp, lines, config={'key': repr(self.key)})
+            os.replace(tmp, fname)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def gather(self, pixels):
+        """Return intensities per line."""
+        outside = self.outside
+        ret = []
+        for indexes in self.indexes:
+            ret.append([255 if i == outside else pixels[i] for i in indexes])
+        return ret
+
+    def get_lines(self, intensities):
+        """Return new lines (lists of [x, y, intensity])."""
+        return [[[x, y, i] for (x, y), i in zip(line, line_intensities)]
+            for line, line_intensities in zip(self.lines, intensities)]
+
+
+PLAN_CACHE_SIZE = 8  # plans in memory
+_PLANS = collections.OrderedDict()  # plan cache in memory (LRU)
+_PLANS_LOCK = threading.Lock()
 
 
 class Pointer(object):
@@ -149,3 +398,71 @@ class Pointer(object):
         if self._is_inside(*point):
             return point
         return None, None
+
+
+class FixedPointer(Pointer):
+    """Calculate next point in integer units (10 ** -digit).
+
+    Points are calculated from the line start, not from the previous point,
+    and line starts from the line number, not from the previous line,
+    so that rounding errors don't accumulate.
+    """
+
+    def __init__(self, conf):
+        self.scale = 10 ** conf.digit
+        super().__init__(conf)
+        self.w, self.h = round(self.w * self.scale), round(self.h * self.scale)
+        self.start = 0, 0
+        self.num = 0  # line number
+
+    def move(self, x, y, direction):
+        x0, y0 = self.start
+        x2 = x + self.step[0] * direction
+        y2 = y0 - round((x2 - x0) * self.tan)
+        if self._is_inside(x2, y2):
+            return '', x2, y2
+
+        # if on the border, move to next line, flip direction
+        limit = self._get_limit(direction)
+        if x == limit[0] or y == limit[1]:
+            x2, y2 = self._get_first_point(x, y, direction)
+            if x2 is not None:
+                self.num += 1
+                self.start = x2, y2
+                return ('first',) + self.start
+
+        # adjust the last point to the border
+        x2, y2 = self._get_last_point(x, y, direction)
+        x2, y2 = round(x2), round(y2)
+        if x2 != x:
+            return 'last', x2, y2
+
+        return 'end', None, None
+
+    def _get_first_point(self, x, y, direction=1):
+        # next line is 'y + x * tan == c', clamped to the border
+        c = (self.num + 1) * self.linestep[1]
+        if self.tan == 0:
+            point = self._get_limit(direction)[0], c
+        elif direction == 1:  # from the top or right border
+            if c <= self.w * self.tan:
+                point = c / self.tan, 0
+            else:
+                point = self.w, c - self.w * self.tan
+        else:  # from the left or bottom border
+            if c <= self.h:
+                point = 0, c
+            else:
+                point = (c - self.h) / self.tan, self.h
+        point = round(point[0]), round(point[1])
+        if self._is_inside(*point):
+            return point
+        return None, None
+
+    def _get_step(self):
+        x = round(self.conf.resolution * self.scale)
+        return x, x * self.tan
+
+    def _get_linestep(self):
+        x, y = super()._get_linestep()
+        return x * self.scale, y * self.scale
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+"""Cut several pictures on one plate, in one g-code program.
+
+Each picture (piece) is built with its own configuration
+(``p2cconfig.py`` in its directory, and piece config updates),
+and placed at a given position, or in rows (shelves) automatically.
+
+The program has only one 'header', 'footer' and initial moves
+(from the nest configuration), and continuous line numbers.
+Pieces are ordered by nearest neighbour (from the last point of a piece
+to the first point of the next), to shorten rapid moves between them.
+"""
+
+import argparse
+import itertools
+import math
+import sys
+import textwrap
+
+from photo2cnccut import base, ui
+
+
+class Piece(object):
+    """One picture on the plate.
+
+    ``position`` is the top-left corner on the plate (x, y),
+    ``None`` is for automatic layout.
+    """
+
+    def __init__(self, fname, config=None, position=None):
+        self.fname = fname
+        self.config = config or {}
+        self.position = position
+        self.data = None
+
+    @property
+    def size(self):
+        conf = self.data.conf
+        return conf.width, conf.height
+
+    def get_lines(self):
+        """Return lines moved to the position (in point coordinates)."""
+        scale = self.data.conf._scale
+        x, y = self.position
+        x, y = x * scale, y * scale
+        if scale != 1:
+            x, y = round(x), round(y)
+        return [[(p[0] + x, p[1] + y, p[2]) for p in line]
+            for line in self.data.lines]
+
+    def get_ends(self):
+        """Return the first and last points on the plate (real units)."""
+        lines = self.data.lines
+        scale = self.data.conf._scale
+        x, y = self.position
+        first, last = lines[0][0], lines[-1][-1]
+        return ((first[0] / scale + x, first[1] / scale + y),
+            (last[0] / scale + x, last[1] / scale + y))
+
+
+class Nest(object):
+    """Build pieces, lay them out, and format one program.
+
+    ``config`` is the nest configuration
+    (used for 'header', 'footer', line numbers and initial moves),
+    ``plate`` is the plate size (width, height),
+    and ``margin`` is the space between pieces (and plate edges).
+    """
+
+    svg_beginning = """
+        <svg width="%s" height="%s" viewBox="0 0 %s %s" xmlns="http://www.w3.org/2000/svg">
+        <rect width="%s" height="%s" fill="%s" />
+    """  # noqa E501 line too long
+
+    piece_beginning = """
+        <svg x="%s" y="%s" width="%s" height="%s" viewBox="0 0 %s %s" fill="%s">
+        <rect width="%s" height="%s" fill="%s" />
+    """  # noqa E501 line too long
+
+    def __init__(self, pieces, config=None, args=None, plate=None,
+            margin=5, data_class=None, conf=None):
+        self.pieces = pieces
+        self.args = args
+        self.plate = plate
+        self.margin = margin
+        self.data_class = data_class
+        self.conf_class = conf or ui.Conf
+        self.conf = self.conf_class(config=config, args=args)
+
+    def build(self):
+        for piece in self.pieces:
+            self.build_piece(piece)
+        self.layout()
+        self.pieces = self.order()
+
+    def build_piece(self, piece):
+        config, data_class = ui._load_user_files(piece.fname)
+        config = dict(config or {}, **piece.config)
+        data_class = self.data_class or data_class
+        if data_class is None:
+            import photo2cnccut.line
+            data_class = photo2cnccut.line.Data
+        data = data_class(config=config, args=self.args, conf=self.conf_class)
+        data.conf.fname = piece.fname
+        data.build()
+        piece.data = data
+
+    def layout(self):
+        """Place pieces without positions in rows, from the top-left.
+
+        Pieces are placed in the order of heights (tallest first),
+        and a new row starts when the plate width is exceeded.
+        Pieces with positions are checked (on the plate, not overlapping).
+        """
+        margin = self.margin
+        plate_w, plate_h = self.plate or (math.inf, math.inf)
+        placed = [p for p in self.pieces if p.position is not None]
+        pieces = [p for p in self.pieces if p.position is None]
+        self._check_placed(placed, plate_w, plate_h)
+        pieces.sort(key=lambda p: p.size[1], reverse=True)
+
+        top = margin
+        if placed:
+            top = max(p.position[1] + p.size[1] for p in placed) + margin
+        x, y, row_h = margin, top, 0
+        for piece in pieces:
+            w, h = piece.size
+            if x + w + margin > plate_w and x > margin:
+                x, y, row_h = margin, y + row_h + margin, 0
+            if x + w + margin > plate_w or y + h + margin > plate_h:
+                msg = 'Piece does not fit on the plate: %s' % piece.fname
+                raise ValueError(msg)
+            piece.position = x, y
+            x += w + margin
+            row_h = max(row_h, h)
+
+    def _check_placed(self, pieces, plate_w, plate_h):
+        for i, piece in enumerate(pieces):
+            (x, y), (w, h) = piece.position, piece.size
+            if x < 0 or y < 0 or x + w > plate_w or y + h > plate_h:
+                msg = 'Piece does not fit on the plate: %s' % piece.fname
+                raise ValueError(msg)
+            for other in pieces[:i]:
+                (x2, y2), (w2, h2) = other.position, other.size
+                if x < x2 + w2 and x2 < x + w and y < y2 + h2 and y2 < y + h:
+                    msg = 'Pieces overlap: %s and %s' % (
+                        other.fname, piece.fname)
+                    raise ValueError(msg)
+
+    def order(self):
+        """Return pieces ordered by nearest neighbour from X0 Y0.
+
+        Pieces without lines (e.g. all blank) are put last.
+        """
+        pieces = [p for p in self.pieces if p.data.lines]
+        empty = [p for p in self.pieces if not p.data.lines]
+        ret = []
+        point = 0, 0
+        while pieces:
+            piece = min(pieces, key=lambda p: math.hypot(
+                p.get_ends()[0][0] - point[0], p.get_ends()[0][1] - point[1]))
+            pieces.remove(piece)
+            ret.append(piece)
+            point = piece.get_ends()[1]
+        return ret + empty
+
+    def get_size(self):
+        """Return the plate size (or the size used by pieces)."""
+        if self.plate:
+            return self.plate
+        w = max(p.position[0] + p.size[0] for p in self.pieces)
+        h = max(p.position[1] + p.size[1] for p in self.pieces)
+        return w + self.margin, h + self.margin
+
+    def format_gcode(self):
+        """Format g-code with one head and tail (as ``GFormatter.format``)."""
+        formatter = base.GFormatter(self.conf, [])
+        formatter.linenum = self.conf.line_number_increment
+        _add_num = formatter._add_line_number
+
+        if self.conf.header:
+            yield from formatter._add_lines(self.conf.header)
+
+        blocks = itertools.chain(
+            formatter._format_head(),
+            *(self._format_piece(p) for p in self.pieces),
+            formatter._format_tail())
+
+        # using prev, just to avoid adding 'M1' to first and last lines.
+        prev = None
+        for block in blocks:
+            if prev is None:
+                prev = _add_num(' '.join(block))
+            else:
+                yield prev
+                yield '\n'
+                prev = _add_num(' '.join(block), m1=True)
+
+        yield _add_num(' '.join(block))
+        yield '\n'
+
+        if self.conf.footer:
+            yield from formatter._add_lines(self.conf.footer)
+
+    def _format_piece(self, piece):
+        data = piece.data
+        if not data.lines:
+            return
+        formatter = data.g_formatter(data.conf, data.lines)
+        links = formatter._get_links()  # on the piece coordinates
+        yield from formatter._format_lines(piece.get_lines(), links)
+        if data.conf.cut_through:  # no retracts between lines
+            yield ['G0', 'Z' + formatter._format_number(data.conf.retract_z)]
+
+    def format_svg(self):
+        """Format svg, with a nested svg element per piece."""
+        def dedent(text):
+            return textwrap.dedent(text.lstrip('\n').rstrip())
+
+        w, h = self.get_size()
+        scale = self.conf.svg_scale
+        W, H = self.conf._round(w * scale), self.conf._round(h * scale)
+        background = self.conf.svg_background
+        yield dedent(self.svg_beginning) % (W, H, w, h, w, h, background)
+        yield '\n'
+        for i, piece in enumerate(self.pieces):
+            conf = piece.data.conf
+            formatter = piece.data.svg_formatter(conf, piece.data.lines)
+            formatter.id_prefix = 'n%dp' % i  # unique in the document
+            chunks = formatter.format()
+            next(chunks)  # the piece beginning is replaced
+            x, y = piece.position
+            pw, ph = piece.size
+            yield dedent(self.piece_beginning) % (x, y, pw, ph, pw, ph,
+                conf.svg_color, pw, ph, conf.svg_background)
+            yield from chunks
+            yield '\n'
+        yield '</svg>\n'
+
+    def _estimate_seconds(self):
+        """Return the sum of piece cut times (rapid moves are omitted)."""
+        seconds = 0
+        for piece in self.pieces:
+            data = piece.data
+            seconds += data.g_formatter(
+                data.conf, data.lines)._estimate_seconds()
+        return seconds
+
+    def write(self, fname):
+        """Write g-code and svg files (``fname + '.nc'`` and '.svg')."""
+        with open(fname + '.nc', 'w') as f:
+            for chunk in self.format_gcode():
+                f.write(chunk)
+        with open(fname + '.svg', 'w') as f:
+            for chunk in self.format_svg():
+                f.write(chunk)
+        if not self.conf._quiet:
+            for piece in self.pieces:
+                print('%s: at %s, %s' % (piece.fname, *piece.position))
+            print('estimated cut time: %s' % base.format_time(
+                self._estimate_seconds()))
+
+
+def parse_piece(text):
+    """Parse commandline piece ('a.jpg' or 'a.jpg@x,y')."""
+    fname, sep, position = text.rpartition('@')
+    if not sep:
+        return Piece(text)
+    try:
+        x, y = (float(v) for v in position.split(','))
+    except ValueError:
+        raise ValueError('Invalid piece position: %r' % text)
+    return Piece(fname, position=(x, y))
+
+
+def parse_plate(text):
+    """Parse plate size ('300x200')."""
+    try:
+        w, h = (float(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise ValueError('Invalid plate size: %r' % text)
+    return w, h
+
+
+def _build_args(args):
+    parser = argparse.ArgumentParser(
+        description='Cut several pictures on one plate, in one program.')
+
+    h = ("file paths to pictures, optionally with top-left positions "
+         "('a.jpg@10,20'), others are placed automatically")
+    parser.add_argument('fnames', nargs='+', metavar='fname', help=h)
+
+    h = "output file path, without extension (default: 'nest')"
+    parser.add_argument('-o', '--output', default='nest', help=h)
+
+    h = "plate size (e.g. '300x200'), for automatic placement"
+    parser.add_argument('--plate', help=h)
+
+    h = 'space between pieces, and from plate edges (default: 5)'
+    parser.add_argument('--margin', type=float, default=5, help=h)
+
+    h = 'suppress normal printout (a few lines of info)'
+    parser.add_argument('-q', '--quiet', action='store_true', help=h)
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = _build_args(args if args is not None else sys.argv[1:])
+    pieces = [parse_piece(text) for text in args.fnames]
+    plate = parse_plate(args.plate) if args.plate else None
+
+    # the nest configuration is from the output directory
+    config, _ = ui._load_user_files(args.output)
+    nest = Nest(pieces, config=config, args=args, plate=plate,
+        margin=args.margin)
+    nest.build()
+    nest.write(args.output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
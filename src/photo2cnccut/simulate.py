@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""Simulate g-code cut on a heightmap (to verify .nc files).
+
+It requires numpy.
+"""
+
+import itertools
+import math
+
+import numpy
+import PIL.Image
+
+from photo2cnccut import base
+
+CHUNKSIZE = 1000000  # moves to process at once
+
+
+class Simulator(object):
+    """Sweep V-bit over a heightmap, following g-code moves.
+
+    The heightmap covers the material (X0 to width, Y0 to -height)
+    with square cells of ``self.cell`` size.
+    Material surface is Z0, and each cell keeps the lowest Z cut.
+
+    Moves are sampled in half cell steps,
+    and the tool tip of each sample is stamped to ``self._tips``.
+    The V-bit shape (cone) is applied to the tips only once at the end
+    (``.heightmap``), so the cost per move is small.
+    """
+
+    def __init__(self, conf, cell=None):
+        self.conf = conf
+        self.cell = cell or conf.simulate_cell or conf.maxwidth / 8
+
+        angle = (conf.tool_angle / 2) * (math.pi / 180)
+        self.tool_tan = math.tan(angle)  # tool width / depth ratio
+
+        cols = int(math.ceil(conf.width / self.cell)) + 1
+        rows = int(math.ceil(conf.height / self.cell)) + 1
+        self._tips = numpy.full((rows, cols), numpy.inf)
+        self._heightmap = None
+
+        self._last = None  # last move of previous chunk
+        self.moves = 0
+        self.rapid_cuts = 0  # rapid moves below Z0
+
+    def read(self, fname):
+        with open(fname) as f:
+            self.run(base.parse_gcode(f))
+
+    def run(self, moves):
+        """Cut with ``(g, x, y, z)`` moves (``base.parse_gcode`` output)."""
+        moves = iter(moves)
+        while True:
+            chunk = itertools.islice(moves, CHUNKSIZE)
+            chunk = numpy.fromiter(
+                itertools.chain.from_iterable(chunk), dtype=float)
+            if chunk.size == 0:
+                break
+            self._run(chunk.reshape(-1, 4))
+
+    def _run(self, moves):
+        self.moves += len(moves)
+        if self._last is not None:
+            moves = numpy.vstack((self._last, moves))
+        self._last = moves[-1:]
+        if len(moves) < 2:
+            return
+
+        g = moves[1:, 0]
+        p0, p1 = moves[:-1, 1:], moves[1:, 1:]
+        below = numpy.minimum(p0[:, 2], p1[:, 2]) < 0
+        self.rapid_cuts += int(numpy.count_nonzero(below & (g == 0)))
+
+        p0, p1 = p0[below], p1[below]
+        if len(p0) == 0:
+            return
+        self._heightmap = None
+        self._stamp(*self._sample(p0, p1))
+
+    def _sample(self, p0, p1):
+        step = self.cell / 2
+        diff = p1 - p0
+        length = numpy.hypot(diff[:, 0], diff[:, 1])
+        num = numpy.ceil(length / step).astype(int) + 1  # including ends
+
+        index = numpy.repeat(numpy.arange(len(num)), num)
+        start = numpy.repeat(numpy.cumsum(num) - num, num)
+        t = numpy.arange(len(index)) - start
+        t = t / numpy.maximum(num - 1, 1)[index]
+
+        points = p0[index] + diff[index] * t[:, None]
+        return points[:, 0], points[:, 1], points[:, 2]
+
+    def _stamp(self, x, y, z):
+        rows, cols = self._tips.shape
+        col = numpy.rint(x / self.cell).astype(int)
+        row = numpy.rint(-y / self.cell).astype(int)
+        inside = ((z < 0) & (0 <= col) & (col < cols)
+            & (0 <= row) & (row < rows))
+        numpy.minimum.at(self._tips, (row[inside], col[inside]), z[inside])
+
+    @property
+    def heightmap(self):
+        if self._heightmap is None:
+            self._heightmap = self._build_heightmap()
+        return self._heightmap
+
+    def _build_heightmap(self):
+        tips = self._tips
+        heightmap = numpy.minimum(tips, 0)
+        if not numpy.isfinite(tips).any():
+            return heightmap
+
+        depth = -tips[numpy.isfinite(tips)].min()
+        radius = depth * self.tool_tan / self.cell  # in cells
+        r = int(math.ceil(radius))
+        for dy in range(-r, r + 1):
+            for dx in range(-r, r + 1):
+                dist = math.hypot(dx, dy)
+                if (dx == 0 and dy == 0) or dist > radius:
+                    continue
+                rise = dist * self.cell / self.tool_tan
+                dst, src = _shift(tips.shape, dy, dx)
+                numpy.minimum(
+                    heightmap[dst], tips[src] + rise, out=heightmap[dst])
+        return heightmap
+
+    def render(self, outfile):
+        """Create shaded grayscale image (deeper and steeper is darker)."""
+        heightmap = self.heightmap
+        gy, gx = numpy.gradient(heightmap, self.cell)
+        # light from top-left, 45 degree high (flat surface is 1.0)
+        light = math.sqrt(0.5)
+        norm = numpy.sqrt(gx * gx + gy * gy + 1)
+        shade = (0.5 * (gx + gy) + light) / norm / light
+
+        depth = -heightmap.min() or 1
+        darkness = 1 - 0.5 * (-heightmap / depth)
+        pixels = numpy.clip(shade * darkness * 255, 0, 255)
+        im = PIL.Image.fromarray(pixels.astype(numpy.uint8))
+        im.save(outfile, format='PNG')
+
+    def get_error(self, im):
+        """Compare cut area with the image, and return tone error.
+
+        Cut area and image darkness are averaged over the line distance,
+        and the mean absolute difference is returned in grayscale (0-255).
+        """
+        conf = self.conf
+        rows, cols = self._tips.shape
+        scale = im.width / conf.width
+        box = (0, 0, im.width, min(im.height, round(conf.height * scale)))
+        if im.mode != 'L':
+            im = im.convert('L')
+        im = im.crop(box).resize((cols, rows))
+        pixels = numpy.asarray(im, dtype=float)
+
+        cut = (self.heightmap < 0).astype(float)
+        target = numpy.minimum((255 - pixels) / 255 / conf.stepover, 1)
+
+        size = conf.maxwidth * conf.stepover / self.cell
+        size = int(round(size)) // 2 * 2 + 1  # odd
+        diff = _box_filter(cut, size) - _box_filter(target, size)
+        return float(numpy.abs(diff).mean() * conf.stepover * 255)
+
+
+def _shift(shape, dy, dx):
+    """Return slices to move an array by (dy, dx) (destination, source)."""
+    rows, cols = shape
+    dst = (slice(max(dy, 0), rows + min(dy, 0)),
+        slice(max(dx, 0), cols + min(dx, 0)))
+    src = (slice(max(-dy, 0), rows + min(-dy, 0)),
+        slice(max(-dx, 0), cols + min(-dx, 0)))
+    return dst, src
+
+
+def _box_filter(a, size):
+    r = size // 2
+    a = numpy.pad(a, r, mode='edge')
+    c = numpy.zeros((a.shape[0] + 1, a.shape[1] + 1))
+    c[1:, 1:] = a.cumsum(0).cumsum(1)
+    s = (c[size:, size:] - c[:-size, size:]
+        - c[size:, :-size] + c[:-size, :-size])
+    return s / (size * size)
+
+
+def simulate(data, infile=None, outfile=None):
+    """Simulate g-code file of ``data``, and create shaded png file.
+
+    Return ``Simulator`` object.
+    """
+    infile = infile or data.conf.fname + '.nc'
+    outfile = outfile or data.conf.fname + '.sim.png'
+    sim = Simulator(data.conf)
+    sim.read(infile)
+    sim.render(outfile)
+    return sim
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""Build variants of one picture with different configurations."""
+
+import ast
+import concurrent.futures
+import copy
+import html
+import itertools
+import os
+import textwrap
+
+from photo2cnccut import ui
+
+_SWEEP = None  # Sweep object for worker processes
+
+
+def get_variants(grid):
+    """Return config updates for all combinations of ``grid`` values.
+
+    ``grid`` is a dictionary of config names and lists of values.
+    """
+    keys = list(grid)
+    values = itertools.product(*(grid[k] for k in keys))
+    return [dict(zip(keys, v)) for v in values]
+
+
+def get_variant_name(fname, variant):
+    tags = ['%s%s' % (k, v) for k, v in variant.items()]
+    return '-'.join([fname] + tags)
+
+
+def parse_grid(items):
+    """Parse commandline sweep items ('key=value1,value2,...').
+
+    Values are python literals, or strings if not.
+    """
+    grid = {}
+    for item in items:
+        key, sep, values = item.partition('=')
+        if not sep or key not in ui._CONFIG:
+            raise ValueError('Invalid sweep item: %r' % item)
+        grid[key] = [_parse_value(v) for v in values.split(',')]
+    return grid
+
+
+def _parse_value(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+class Sweep(object):
+    """Build and write all variants, loading the picture only once.
+
+    The loaded picture and pixels are shared by all variants.
+    With ``jobs`` other than 1, variants are built in worker processes
+    (0 means the number of cpus).
+    The picture is sent to each process only once.
+    """
+
+    sheet_beginning = """
+        <svg width="%s" height="%s" xmlns="http://www.w3.org/2000/svg">
+        <rect width="%s" height="%s" fill="%s" />
+    """
+
+    sheet_ending = """
+        </svg>
+    """
+
+    label_height = 60
+
+    def __init__(self, fname, grid, config=None, args=None,
+            data_class=None, conf=None, jobs=1):
+        if data_class is None:
+            import photo2cnccut.line
+            data_class = photo2cnccut.line.Data
+
+        self.fname = fname
+        self.grid = grid
+        self.config = config or {}
+        if args is not None:
+            args = copy.copy(args)
+            args.quiet = True  # see .print_summary
+        self.args = args
+        self.data_class = data_class
+        self.conf = conf
+        self.jobs = jobs
+
+        self._im = None
+        self._pixels = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pixels'] = None  # rebuild from self._im in each process
+        return state
+
+    def run(self):
+        """Build all variants, write the summary, and return the results."""
+        self.load_image()
+        variants = get_variants(self.grid)
+        if self.jobs == 1:
+            results = [self.build_variant(v) for v in variants]
+        else:
+            results = self._run_parallel(variants)
+        self.write_sheet(results)
+        return results
+
+    def _run_parallel(self, variants):
+        workers = self.jobs or None
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker, initargs=(self,)) as executor:
+            return list(executor.map(_build_variant, variants))
+
+    def new_data(self, variant):
+        config = dict(self.config, **variant)
+        return self.data_class(config=config, args=self.args, conf=self.conf)
+
+    def load_image(self):
+        data = self.new_data({})
+        data.load_image(self.fname)
+        self._im = data._im
+        self._pixels = data.pixels
+
+    def build_variant(self, variant):
+        data = self.new_data(variant)
+        data.conf.fname = get_variant_name(self.fname, variant)
+        if self.jobs != 1:
+            data.conf.jobs = 1  # variants are already in processes
+
+        if self._pixels is None:
+            data.get_pixels(self._im)
+            self._pixels = data.pixels
+        data._im = self._im
+        data.get_sizes(self._im)
+        data.get_mask(self._im)
+        data.build(pixels=self._pixels)
+
+        formatter = data.write_gcode()
+        data.write_svg()
+        return {
+            'fname': data.conf.fname,
+            'variant': variant,
+            'size': data.svg_formatter(data.conf, data.lines)._get_size(),
+            'time': formatter._estimate(),
+            'depth': formatter._get_depth_range(),
+        }
+
+    def write_sheet(self, results):
+        """Write svg contact sheet (``<fname>.sweep.svg``).
+
+        It refers to the variant svg files, with estimated cut times
+        and depth ranges under them.
+        """
+        if not results:
+            return
+        columns = len(list(self.grid.values())[-1]) if self.grid else 1
+        width = max(r['size'][0] for r in results)
+        height = max(r['size'][1] for r in results) + self.label_height
+        rows = (len(results) + columns - 1) // columns
+
+        margin = 10
+        W = columns * (width + margin) + margin
+        H = rows * (height + margin) + margin
+
+        def dedent(text):
+            return textwrap.dedent(text.lstrip('\n').rstrip())
+
+        with open(self.fname + '.sweep.svg', 'w') as f:
+            background = self.config.get('svg_background', 'white')
+            f.write(dedent(self.sheet_beginning) % (W, H, W, H, background))
+            f.write('\n')
+            for i, result in enumerate(results):
+                x = margin + (i % columns) * (width + margin)
+                y = margin + (i // columns) * (height + margin)
+                f.write(''.join(self._format_cell(result, x, y)))
+            f.write(dedent(self.sheet_ending))
+
+    def _format_cell(self, result, x, y):
+        w, h = result['size']
+        href = html.escape(os.path.basename(result['fname']) + '.svg')
+        yield '<image href="%s" x="%s" y="%s" width="%s" height="%s"/>\n' % (
+            href, x, y, w, h)
+
+        variant = result['variant'].items()
+        tags = ' '.join('%s: %s' % (k, v) for k, v in variant)
+        texts = (
+            tags,
+            'time: %s' % result['time'],
+            'depth: %s to %s' % result['depth'],
+        )
+        for i, text in enumerate(texts):
+            yield ('<text x="%s" y="%s" font-family="sans-serif" '
+                'font-size="14">%s</text>\n') % (
+                x, y + h + 18 * (i + 1), html.escape(text))
+
+    def print_summary(self, results):
+        for result in results:
+            print('%s: %s, depth %s to %s' % (
+                result['fname'], result['time'], *result['depth']))
+
+
+def _init_worker(sweep):
+    global _SWEEP
+    _SWEEP = sweep
+
+
+def _build_variant(variant):
+    return _SWEEP.build_variant(variant)
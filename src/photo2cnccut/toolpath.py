@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""Save and load built lines as binary toolpath file.
+
+File layout (little endian):
+
+    header (40 bytes):
+        magic (8 bytes), version (uint32), reserved (uint32),
+        number of lines (uint64), number of points (uint64),
+        config size (uint64)
+    config (json, padded to 8 bytes)
+    offsets (int64 * (lines + 1)), start indexes of lines in points
+    x (float64 * points)
+    y (float64 * points)
+    intensity (float64 * points)
+    kinds (uint8 * points), bit flags for int values (x: 1, y: 2, i: 4)
+
+Kinds keep int values as int (e.g. '30.' and '30.0' in output differ).
+"""
+
+import array
+import collections.abc
+import contextlib
+import json
+import mmap
+import struct
+import sys
+
+EXT = '.p2c'
+
+MAGIC = b'P2CTOOL\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQQQ')
+
+_X, _Y, _I = 1, 2, 4
+
+
+class ToolpathError(Exception):
+    """Raise when toolpath file is invalid."""
+
+
+def _pad(size):
+    return -size % 8
+
+
+def _little(arr):
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+def write(fname, lines, conf=None, config=None):
+    """Write ``lines`` and the configuration that built them.
+
+    ``fname`` can also be a binary file object.
+    ``config`` (a dictionary) is written instead of ``conf``, if given.
+    """
+    offsets = array.array('q', [0])
+    xs, ys, intensities = (array.array('d') for _ in range(3))
+    kinds = array.array('B')
+
+    for line in lines:
+        for x, y, intensity in line:
+            xs.append(x)
+            ys.append(y)
+            intensities.append(intensity)
+            kinds.append((isinstance(x, int) and _X)
+                | (isinstance(y, int) and _Y)
+                | (isinstance(intensity, int) and _I))
+        offsets.append(len(xs))
+
+    if config is None:
+        config = {k: getattr(conf, k) for k in conf._config}
+    config = json.dumps(config, default=str).encode('utf-8')
+
+    with contextlib.ExitStack() as stack:
+        if hasattr(fname, 'write'):
+            f = fname
+        else:
+            f = stack.enter_context(open(fname, 'wb'))
+        f.write(_HEADER.pack(MAGIC, VERSION, 0,
+            len(offsets) - 1, len(xs), len(config)))
+        f.write(config)
+        f.write(b'\0' * _pad(len(config)))
+        for arr in (offsets, xs, ys, intensities, kinds):
+            f.write(_little(arr).tobytes())
+
+
+class Toolpath(object):
+    """Load toolpath file with memory mapping.
+
+    ``self.lines`` reads points from the file without copying,
+    and it can be passed to formatters (and ``Data.build``) as is.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self):
+        buf = self._view(memoryview(self._mmap))
+        if len(buf) < _HEADER.size:
+            raise ToolpathError('Not a toolpath file: %s' % self.fname)
+        magic, version, _, nlines, npoints, size = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise ToolpathError('Not a toolpath file: %s' % self.fname)
+        if version > VERSION:
+            msg = 'Unsupported toolpath version %d: %s'
+            raise ToolpathError(msg % (version, self.fname))
+
+        pos = _HEADER.size
+        config = bytes(buf[pos:pos + size])
+        self.config = json.loads(config.decode('utf-8'))
+        pos += size + _pad(size)
+
+        def take(fmt, num):
+            nonlocal pos
+            end = pos + num * struct.calcsize(fmt)
+            if end > len(buf):
+                raise ToolpathError('Truncated toolpath: %s' % self.fname)
+            view = self._cast(buf[pos:end], fmt)
+            pos = end
+            return view
+
+        offsets = take('q', nlines + 1)
+        xs, ys, intensities = (take('d', npoints) for _ in range(3))
+        kinds = take('B', npoints)
+        self.lines = Lines(offsets, xs, ys, intensities, kinds)
+
+    def _view(self, view):
+        self._views.append(view)
+        return view
+
+    def _cast(self, view, fmt):
+        if sys.byteorder == 'big' and fmt != 'B':
+            arr = array.array(fmt)
+            arr.frombytes(view)
+            arr.byteswap()
+            return arr
+        return self._view(self._view(view).cast(fmt))
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Lines(collections.abc.Sequence):
+    """Sequence of lines, reading from toolpath arrays."""
+
+    def __init__(self, offsets, xs, ys, intensities, kinds):
+        self._offsets = offsets
+        self._arrays = xs, ys, intensities, kinds
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return Line(start, end, *self._arrays)
+
+
+class Line(collections.abc.Sequence):
+    """Sequence of points (x, y, intensity)."""
+
+    def __init__(self, start, end, xs, ys, intensities, kinds):
+        self._start = start
+        self._end = end
+        self._arrays = xs, ys, intensities, kinds
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('point index out of range')
+        return self._get_point(self._start + index)
+
+    def __iter__(self):
+        get_point = self._get_point
+        for i in range(self._start, self._end):
+            yield get_point(i)
+
+    def _get_point(self, i):
+        xs, ys, intensities, kinds = self._arrays
+        x, y, intensity, kind = xs[i], ys[i], intensities[i], kinds[i]
+        if kind:
+            if kind & _X:
+                x = int(x)
+            if kind & _Y:
+                y = int(y)
+            if kind & _I:
+                intensity = int(intensity)
+        return x, y, intensity
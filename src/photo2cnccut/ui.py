@@ -4,9 +4,7 @@
 
 import argparse
 import copy
-import importlib
 import math
-import os
 import sys
 import time
 
@@ -44,6 +42,12 @@ _CONFIG = {
     # round to this digit (e.g. 1.2345 to 1.234 when 3)
     'digit': 3,
 
+    # Keep coordinates and depths as integers in units of 10 ** -digit.
+    # Points are stepped from each line start (without float drift),
+    # and formatted by integer to string conversion.
+    # The output may differ a little from the default (float) one.
+    'fixed_point': False,
+
     # add line number (one of 'all', 'retract' or 'none')
     # When 'retract', 'M1' is also appended to the line ('N280 G0 Z3. M1').
     # This is convenient for line method (stops at each line end retract),
@@ -87,6 +91,17 @@ _CONFIG = {
     'svg_color': 'black',
     'svg_background': 'white',
 
+    # How to draw points in svg (only for 'point' method).
+    # 'circle': one <circle> element per point (exact radius).
+    # 'use': radius is quantized to the intensity level (0 to 255),
+    #     each level is defined once in <defs>,
+    #     and points refer to it with short <use> elements.
+    # 'path': radius is quantized likewise,
+    #     and one <path> element per level draws all its points
+    #     (zero-length subpaths with round line caps).
+    # 'use' and 'path' omit points without width (grayscale 255).
+    'svg_point': 'circle',
+
     # scale svg size from g-code width and height.
     # 1.0 means 100px for width 100,
     # which is sometimes too small for web browsers.
@@ -105,6 +120,50 @@ _CONFIG = {
     # Normally, 'method' should be 'line'.
     'cut_through': False,
 
+    # Link the end of a line to the start of the next line
+    # with a feed move (G1), omitting retract and plunge between them,
+    # when they are on the material border, and closer than this distance.
+    # 0 means no link. Only for 'line' method without 'cut_through'.
+    'link_distance': 0,
+
+    # Number of processes to format g-code and svg
+    # (0 means the number of cpus). The output is the same.
+    'jobs': 1,
+
+    # Number of points '--draft' coarsens to.
+    # It scales up 'resolution' and 'maxwidth' together,
+    # to keep the tone (ratio of cut area).
+    'draft_points': 20000,
+
+    # Cell size of the heightmap for '--simulate' (0 means maxwidth / 8).
+    'simulate_cell': 0,
+
+    # Split lines at blank (not cut) spans,
+    # and move over them with retract and rapid moves,
+    # instead of feeding at Z0. Point method just omits blank points.
+    'skip_blank': False,
+
+    # Intensity (grayscale) from which points are blank (255 is white).
+    'blank_threshold': 255,
+
+    # Blank spans shorter than this length are fed through as usual.
+    'blank_min_gap': 1.0,
+
+    # Mask picture file path (relative to the picture file directory),
+    # or PIL image (in-memory use).
+    # Points on dark parts (grayscale < 128) are not cut
+    # (intensity is set to 255, and skipped with 'skip_blank').
+    'mask': '',
+
+    # Use the alpha channel of the picture as mask (transparent is not cut).
+    'mask_alpha': False,
+
+    # Directory to save point position plans in (e.g. '.p2cplans').
+    # Pictures of the same size and geometry config share a plan,
+    # so that only pixel values are read for the next pictures.
+    # Recently used plans are also cached in memory (in one process).
+    'plan_cache': '',
+
     # Line/Point Method Specific:
 
     # It starts around the top-left corner (X0, Y0),
@@ -132,15 +191,21 @@ class Conf(object):
             self._config.update(config)
         for k, v in self._config.items():
             setattr(self, k, v)
-        fname = getattr(args, 'fname', None)
-        if fname:
-            setattr(self, 'fname', fname)
+        # args are optional (e.g. in-memory use, see base.Data.load_image)
+        self.fname = getattr(args, 'fname', None)
+        self._quiet = getattr(args, 'quiet', args is None)  # no args: library
+        jobs = getattr(args, 'jobs', None)
+        if jobs is not None:
+            setattr(self, 'jobs', jobs)
 
         line_angle = self.line_angle * (math.pi / 180)
         self.sin = math.sin(line_angle)
         self.cos = math.cos(line_angle)
         self.tan = math.tan(line_angle)
 
+        # point coordinates / real coordinates
+        self._scale = 10 ** self.digit if self.fixed_point else 1
+
         self._times = [time.time()]
 
     def _round(self, x):
@@ -150,7 +215,7 @@ class Conf(object):
         return x
 
     def _time(self, msg):
-        if self._args._time:
+        if getattr(self._args, '_time', False):
             t = self._times
             t.append(time.time())
             print('%-6s %.3f' % (msg, (t[-1] - t[-2])))
@@ -192,6 +257,45 @@ def _build_args(args):
          "(<fname> + '.svg' to <fname> + '.png')")
     parser.add_argument('-p', '--png', action='store_true', help=h)
 
+    h = ("create only binary toolpath file (<fname> + '.p2c'). "
+         "If fname is a toolpath file, it is used instead of a picture")
+    parser.add_argument('-t', '--toolpath', action='store_true', help=h)
+
+    h = ('create only coarse preview png file '
+         "(<fname> + '.draft.png'), without g-code, "
+         "sampling about 'draft_points' points")
+    parser.add_argument('-d', '--draft', action='store_true', help=h)
+
+    h = ('simulate g-code file on a heightmap (requires numpy), '
+         "create shaded png file (<fname> + '.sim.png'), "
+         'and print tone error against the picture '
+         '(g-code file is always written)')
+    parser.add_argument('-S', '--simulate', action='store_true', help=h)
+
+    h = ('build all combinations of config values, '
+         "e.g. '--sweep line_angle=0,45 --sweep stepover=1.0,1.5' "
+         "(<fname> + '-line_angle0-stepover1.0.nc' ...), "
+         "and create svg contact sheet (<fname> + '.sweep.svg')")
+    parser.add_argument('--sweep', action='append', metavar='KEY=VALUES',
+        help=h)
+
+    h = ('print estimated numbers (points, lines, g-code size, cut time etc.) '
+         'from the line geometry and the picture histogram, '
+         'without building lines or creating files')
+    parser.add_argument('-P', '--preflight', action='store_true', help=h)
+
+    h = ("cut time budget (e.g. '90', '1h30m', plain number is minutes). "
+         "Choose 'stepover' and 'resolution' by analytic estimates, "
+         'and print predicted time')
+    parser.add_argument('--budget', help=h)
+
+    h = "g-code size budget (e.g. '500k', '2M'), with or without --budget"
+    parser.add_argument('--max-size', help=h)
+
+    h = ("number of processes for --sweep and formatting (config 'jobs'), "
+         '0 means the number of cpus')
+    parser.add_argument('-j', '--jobs', type=int, help=h)
+
     h = 'print time passed (for development)'
     parser.add_argument('-_t', '--_time', action='store_true',
         help=argparse.SUPPRESS)
@@ -200,28 +304,9 @@ def _build_args(args):
     return parser, args
 
 
-def _get_python_object(directory, fname, objname):
-    if os.path.isfile(os.path.join(directory, fname)):
-        if directory not in sys.path:
-            sys.path.insert(0, directory)
-        try:
-            mod = importlib.import_module(fname[:-3])
-            return getattr(mod, objname, None)
-        except (ImportError, AttributeError):
-            pass
-
-
 def _load_user_files(fname):
-    directory = os.path.dirname(fname)
-
-    config = _get_python_object(
-        directory, CONFIG_FILENAME, CONFIG_DICTIONARY_NAME)
-    data_class = _get_python_object(
-        directory, DATA_FILENAME, DATA_CLASS_NAME)
-
-    if directory in sys.path:
-        sys.path.remove(directory)  # remove the first item
-    return config, data_class
+    from photo2cnccut import job  # job imports ui
+    return job.load_user_files(fname)
 
 
 def _print_default_config(comment=False):
@@ -275,24 +360,85 @@ def main(args=None, data_class=None, conf=None):
     if conf is None:
         conf = Conf
 
+    import photo2cnccut.toolpath
+    if not args.fname.endswith(photo2cnccut.toolpath.EXT):
+        return _main(args, config, data_class, conf)
+
+    for name in ('draft', 'sweep', 'preflight', 'budget', 'max_size'):
+        if getattr(args, name):
+            msg = '--%s requires a picture, not a toolpath file: %s' % (
+                name.replace('_', '-'), args.fname)
+            raise ValueError(msg)
+    with photo2cnccut.toolpath.Toolpath(args.fname) as path:
+        return _main(args, path.config, data_class, conf, path)
+
+
+def _main(args, config, data_class, conf, path=None):
+    if args.sweep:
+        import photo2cnccut.sweep
+        grid = photo2cnccut.sweep.parse_grid(args.sweep)
+        sweep = photo2cnccut.sweep.Sweep(args.fname, grid, config=config,
+            args=args, data_class=data_class, conf=conf,
+            jobs=1 if args.jobs is None else args.jobs)
+        results = sweep.run()
+        if not args.quiet:
+            sweep.print_summary(results)
+        return
+
     data = data_class(config=config, args=args, conf=conf)
-    data.build()
+
+    if args.preflight:
+        import photo2cnccut.preflight
+        estimate = photo2cnccut.preflight.preflight(data)
+        print(estimate.format())
+        return
+
+    if args.draft:
+        data.load_image()
+        changes = data.coarsen(data.conf.draft_points)
+        data.build(pixels=data.pixels)
+        data.write_draft()
+        if not args.quiet:
+            for name, (old, new) in changes.items():
+                print('draft %s: %s (from %s)' % (name, new, old))
+        return
+
+    estimate = None
+    if path:
+        data.load_toolpath(path)
+    elif args.budget or args.max_size:
+        import photo2cnccut.budget as budget
+        seconds = budget.parse_time(args.budget) if args.budget else None
+        size = budget.parse_size(args.max_size) if args.max_size else None
+        data.load_image()
+        estimate = budget.fit(data, seconds, size)
+        data.build(pixels=data.pixels)
+    else:
+        data.build()
 
     if args.print_config:
         print(data.print_config())
         return
 
-    if args.gcode or args.svg or args.png:
-        if args.gcode:
+    if args.gcode or args.svg or args.png or args.toolpath:
+        if args.gcode or args.simulate:  # simulation reads the file
             data.write_gcode()
         if args.svg:
             data.write_svg()
         if args.png:
             data.write_png()
+        if args.toolpath and not path:
+            data.write_toolpath()
     else:
         data.write_gcode()
         data.write_svg()
 
+    if estimate and not args.quiet:
+        print(budget.format_report(estimate, seconds, size))
+
+    if args.simulate:
+        data.write_simulation()
+
 
 if __name__ == '__main__':
     sys.exit(main())
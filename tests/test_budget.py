@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import photo2cnccut.budget
+import photo2cnccut.line
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+
+def test_parse():
+    parse_time = photo2cnccut.budget.parse_time
+    assert parse_time('90') == 5400
+    assert parse_time('1h30m') == 5400
+    assert parse_time('45 sec') == 45
+    with pytest.raises(ValueError):
+        parse_time('1x')
+
+    parse_size = photo2cnccut.budget.parse_size
+    assert parse_size('500k') == 500000
+    assert parse_size('2M') == 2000000
+    assert parse_size('123') == 123
+
+
+def _build(config):
+    d = photo2cnccut.line.Data(config=config)
+    d.build(image='cylinder.png')
+    return d
+
+
+def test_fit():
+    config = {'width': 30, 'resolution': 0.4}
+    d = _build(config)
+    full = d.g_formatter(d.conf, d.lines)._estimate_seconds()
+
+    d = photo2cnccut.line.Data(config=config)
+    d.load_image('cylinder.png')
+    estimate = photo2cnccut.budget.fit(d, full / 2, 20000)
+    assert d.conf.stepover > 1.2
+    d.build(pixels=d.pixels)
+    formatter = d.g_formatter(d.conf, d.lines)
+    assert formatter._estimate_seconds() < full / 2
+    assert len(''.join(formatter.format())) < 20000 * 1.05
+    assert 'budget' in photo2cnccut.budget.format_report(estimate, full / 2)
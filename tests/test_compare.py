@@ -0,0 +1,84 @@
+import io
+import os
+import re
+
+import photo2cnccut.compare
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+REF = 'cylinder.png.ref'
+
+
+def _read(fname):
+    with open(fname) as f:
+        return f.read()
+
+
+def _reformat(text):
+    """Change number formats ('2.' to '2.000', '0.4' to '.400')."""
+    def sub(m):
+        num = '%.3f' % float(m.group(0))
+        return re.sub(r'^(-?)0\.', r'\1.', num)
+    return re.sub(r'(?<=[XYZ"\s])-?\d*\.\d*', sub, text)
+
+
+def test_gcode():
+    compare = photo2cnccut.compare.compare_gcode
+    text = _read(REF + '.nc')
+    new = _reformat(re.sub(r'^N\d+ |( M1)$', '', text, flags=re.M))
+    assert new != text
+    result = compare(io.StringIO(text), io.StringIO(new))
+    assert result.equal
+    assert result.max_xy < 1e-9 and result.max_z < 1e-9
+
+    lines = text.splitlines(True)
+    num = next(i for i, line in enumerate(lines) if 'Z-' in line)
+    lines[num] = lines[num].replace('Z-', 'Z-1', 1)
+    result = compare(text.splitlines(), lines)
+    assert not result
+    assert result.first.lines == (num + 1, num + 1)
+    assert 'z deviation' in result.first.message
+    assert result.max_z > 0.9
+
+    result = compare(text.splitlines(), text.splitlines()[:num])
+    assert result.first.message == 'file 2 ends'
+
+
+def test_svg(tmp_path):
+    fname = str(tmp_path / 'new.svg')
+    with open(fname, 'w') as f:
+        f.write(_reformat(_read(REF + '.svg')))
+    compare = photo2cnccut.compare.compare_files
+    assert compare(REF + '.svg', fname)
+
+    with open(fname, 'w') as f:
+        f.write(_read(REF + '.svg').replace(' 0.4 ', ' 0.41 ', 1))
+    result = compare(REF + '.svg', fname, xy_tolerance=0.005)
+    assert not result
+    assert abs(result.max_xy - 0.01) < 1e-9
+
+
+def test_svg_path(tmp_path):
+    compare = photo2cnccut.compare.compare_files
+    text = '<svg><path stroke-width="%s" d="M 1,2 L3 4h0"/></svg>\n'
+    fnames = []
+    for i, (width, d) in enumerate([
+            ('1.0', 'M 1,2 L3 4h0'),
+            ('1.0', 'M1 2L 3,4 h0'),
+            ('1.5', 'M 1,2 L3 4h0')]):
+        fnames.append(str(tmp_path / ('%d.svg' % i)))
+        with open(fnames[-1], 'w') as f:
+            f.write(text.replace('M 1,2 L3 4h0', d) % width)
+
+    assert compare(fnames[0], fnames[1])
+    result = compare(fnames[0], fnames[2])
+    assert not result
+    assert 'z deviation' in result.first.message
+    assert abs(result.max_z - 0.5) < 1e-9
+
+
+def test_main(capsys):
+    assert photo2cnccut.compare.main([REF + '.nc', REF + '.nc']) == 0
+    assert 'equivalent' in capsys.readouterr().out
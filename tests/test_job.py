@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+import photo2cnccut.job
+import photo2cnccut.line
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+
+def _make_dir(tmpdir, name, width):
+    directory = tmpdir.mkdir(name)
+    shutil.copy('cylinder.png', str(directory))
+    directory.join('p2cconfig.py').write(
+        "config = {'width': %s, 'resolution': 0.5}\n" % width)
+    return str(directory.join('cylinder.png'))
+
+
+def test_cache(tmpdir):
+    fname = _make_dir(tmpdir, 'a', 20)
+    config, data_class = photo2cnccut.job.load_user_files(fname)
+    assert config['width'] == 20
+    assert data_class is None
+
+    config['width'] = 0  # a copy
+    assert photo2cnccut.job.load_user_files(fname)[0]['width'] == 20
+
+    path = os.path.join(os.path.dirname(fname), 'p2cconfig.py')
+    with open(path, 'w') as f:
+        f.write("config = {'width': 25}\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert photo2cnccut.job.load_user_files(fname)[0]['width'] == 25
+
+
+def test_import_error(tmpdir):
+    fname = _make_dir(tmpdir, 'a', 20)
+    tmpdir.join('a', 'p2cmodule.py').write('import p2chelper\n')
+    tmpdir.join('a', 'p2chelper.py').write('')
+    with pytest.raises(ImportError, match='p2cmodule.py'):
+        photo2cnccut.job.load_user_files(fname)
+
+
+def test_jobs(tmpdir):
+    fnames = [_make_dir(tmpdir, str(w), w) for w in (20, 24, 28)]
+
+    serial = [photo2cnccut.job.Job(fname).run() for fname in fnames]
+    jobs = [photo2cnccut.job.Job(fname) for fname in fnames * 2]
+    results = photo2cnccut.job.run_jobs(jobs, workers=4)
+    assert results == serial * 2
+    assert serial[0]['gcode'] != serial[1]['gcode']
+    assert b'width="20' in serial[0]['svg']
+    assert b'width="28' in serial[2]['svg']
+
+
+def test_plan_cache(tmpdir):
+    config = {'width': 30, 'resolution': 0.4, 'plan_cache': str(tmpdir)}
+    photo2cnccut.line._PLANS.clear()
+    serial = photo2cnccut.job.Job('cylinder.png', config).run()
+
+    photo2cnccut.line._PLANS.clear()
+    tmpdir.remove()
+    jobs = [photo2cnccut.job.Job('cylinder.png', config) for _ in range(6)]
+    results = photo2cnccut.job.run_jobs(jobs, workers=6)
+    assert results == [serial] * 6
+    assert len(tmpdir.listdir()) == 1
+    assert len(photo2cnccut.line._PLANS) == 1
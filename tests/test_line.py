@@ -1,10 +1,14 @@
 
 import argparse
 import glob
+import io
 import os
+import re
 import subprocess
 import sys
 
+import pytest
+
 import photo2cnccut.base
 import photo2cnccut.line
 import photo2cnccut.ui
@@ -99,10 +103,326 @@ class TestBasic:
             os.remove(png)
 
 
+def test_sweep():
+    import photo2cnccut.sweep
+
+    fname = TestBasic.fname
+    config = {
+        'width': 10,
+        'height': 10,
+        'maxwidth': 1.0,
+        'resolution': 0.8,
+    }
+    grid = {'line_angle': [0, 10, 45, 70], 'stepover': [1.0, 1.5]}
+    _, args = photo2cnccut.ui._build_args([fname])
+    sweep = photo2cnccut.sweep.Sweep(fname, grid, config, args, jobs=2)
+    results = sweep.run()
+
+    assert len(results) == 8
+    for result in results:
+        variant = result['variant']
+        ref = '%s-deg%02d-step%.1f' % (
+            fname, variant['line_angle'], variant['stepover'])
+        for ext in ('.nc', '.svg'):
+            verify_files(result['fname'] + ext, ref + ext)
+            os.remove(result['fname'] + ext)
+    with open(fname + '.sweep.svg') as f:
+        assert f.read().count('<image ') == 8
+    os.remove(fname + '.sweep.svg')
+
+
+def test_draft():
+    fname = 'cylinder.png'
+    photo2cnccut.ui.main(['-q', '--draft', fname])
+    assert os.path.isfile(fname + '.draft.png')
+    assert not os.path.isfile(fname + '.nc')
+    os.remove(fname + '.draft.png')
+
+    _, args = photo2cnccut.ui._build_args([fname])
+    d = photo2cnccut.line.Data(config={'width': 100}, args=args)
+    d.load_image()
+    changes = d.coarsen(2000)
+    assert set(changes) == {'resolution', 'maxwidth'}
+    d.build(pixels=d.pixels)
+    points = sum(len(line) for line in d.lines)
+    assert 1500 < points < 2500
+
+
+def _build(cls=photo2cnccut.line.Data, build=True, **config):
+    """Return Data for 'cylinder.png' (width 30, resolution 0.4)."""
+    _, args = photo2cnccut.ui._build_args([])
+    args.fname = 'cylinder.png'
+    config = dict({'width': 30, 'resolution': 0.4}, **config)
+    d = cls(config=config, args=args)
+    if build:
+        d.build()
+    return d
+
+
+def test_link():
+    d = _build(link_distance=3)
+
+    g = photo2cnccut.base.GFormatter(d.conf, d.lines)
+    gcode = ''.join(g.format())
+    links = g._get_links()
+    assert len(links) > 0
+    assert gcode.count('G0 ') == 1 + len(d.lines) - len(links)
+    moves = list(photo2cnccut.base.parse_gcode(gcode.split('\n')))
+    assert all(z >= 0 for g_, x, y, z in moves if g_ == 0)
+
+    svg = photo2cnccut.base.SVGFormatter(d.conf, d.lines)
+    assert ''.join(svg.format()).count('<path ') == len(d.lines) + len(links)
+
+    d.conf.link_distance = 0
+    nolink = photo2cnccut.base.GFormatter(d.conf, d.lines)
+    assert nolink._get_links() == set()
+    assert g._estimate() != nolink._estimate()
+
+
+def test_process_intensity():
+    def gamma(i):
+        return round(255 * (i / 255) ** 2.2)
+
+    class Scalar(photo2cnccut.line.Data):
+        def process_intensity(self, intensity):
+            return gamma(intensity)
+
+    class Batch(photo2cnccut.line.Data):
+        def process_intensities(self, intensities):
+            return [gamma(i) for i in intensities]
+
+    class Table(photo2cnccut.line.Data):
+        def init2(self):
+            self.intensity_table = photo2cnccut.base.make_intensity_table(
+                gamma)
+
+    class Omit(photo2cnccut.line.Data):
+        def process_intensity(self, intensity):
+            return None if intensity == 255 else intensity
+
+    lines = [_build(cls).lines
+        for cls in (Scalar, Batch, Table, Omit, photo2cnccut.line.Data)]
+
+    assert lines[0] == lines[1] == lines[2]
+    assert lines[0] != lines[4]
+    points = [p for line in lines[4] for p in line if p[2] != 255]
+    assert [p for line in lines[3] for p in line] == points
+
+
+@pytest.mark.parametrize('update', [
+    {},
+    {'line_number_type': 'all', 'header': 'G0 G90\nG21'},
+    {'line_number_type': 'none', 'link_distance': 2},
+    {'cut_through': True},
+    {'method': 'point', 'svg_point': 'use'},
+])
+def test_parallel(update):
+    d = _build(**update)
+    for cls in (photo2cnccut.base.GFormatter,
+            photo2cnccut.base.SVGFormatter):
+        d.conf.jobs = 1
+        serial = cls(d.conf, d.lines)
+        text = ''.join(serial.format())
+        d.conf.jobs = 3
+        parallel = cls(d.conf, d.lines)
+        assert ''.join(parallel.format()) == text
+        if cls is photo2cnccut.base.GFormatter:
+            assert parallel._depth_cache == serial._depth_cache
+            assert parallel.linenum == serial.linenum
+
+
+def test_fixed_point():
+    moves = []
+    for fixed_point in (False, True):
+        d = _build(line_angle=45, fixed_point=fixed_point)
+        g = photo2cnccut.base.GFormatter(d.conf, d.lines)
+        gcode = ''.join(g.format())
+        moves.append(list(photo2cnccut.base.parse_gcode(gcode.split('\n'))))
+        svg = photo2cnccut.base.SVGFormatter(d.conf, d.lines)
+        assert svg._get_size() == (150, 250)
+
+    assert all(isinstance(v, int) for line in d.lines for p in line
+        for v in p[:2])
+    assert abs(len(moves[0]) - len(moves[1])) <= 1
+
+    f = g._format_fixed
+    assert [f(0), f(1500), f(-2000), f(7), f(-120)] == [
+        '0', '1.5', '-2.', '0.007', '-0.12']
+    assert f(2000, dot='') == '2'
+
+
+@pytest.mark.parametrize('angle', [0, 30, 70])
+def test_fixed_point_drift(angle):
+    d = _build(build=False, width=300, resolution=0.5, line_angle=angle,
+        fixed_point=True)
+    d.load_image()
+    conf = d.conf
+    w, h = conf.width, conf.height
+    distance = conf.maxwidth * conf.stepover / conf.cos
+
+    # line k is 'y + x * tan == k * distance',
+    # odd lines start from the left or bottom, even from the top or right
+    def get_start(k):
+        c = k * distance
+        if conf.tan == 0:
+            return (0 if k % 2 else w), c
+        if k % 2:
+            return (0, c) if c <= h else ((c - h) / conf.tan, h)
+        if c <= w * conf.tan:
+            return c / conf.tan, 0
+        return w, c - w * conf.tan
+
+    lines = d.walk()
+    assert len(lines) > 300
+    for k, line in enumerate(lines, 1):
+        x, y = get_start(k)
+        assert abs(line[0][0] / conf._scale - x) <= 0.0006
+        assert abs(line[0][1] / conf._scale - y) <= 0.0006
+
+
+def test_skip_blank(tmp_path):
+    def build(update):
+        d = _build(**update)
+        g = photo2cnccut.base.GFormatter(d.conf, d.lines)
+        return d.lines, ''.join(g.format()), g._estimate()
+
+    def cut_points(lines):
+        return [tuple(p) for line in lines for p in line if p[2] < 255]
+
+    lines, gcode, estimate = build({})
+    lines2, gcode2, estimate2 = build({'skip_blank': True})
+    assert cut_points(lines) == cut_points(lines2)
+    assert sum(map(len, lines2)) < sum(map(len, lines))
+    assert len(gcode2) < len(gcode)
+    assert estimate2 != estimate
+    for line in lines2:
+        assert any(p[2] < 255 for p in line)
+
+    lines3, _, _ = build({'skip_blank': True, 'method': 'point'})
+    assert cut_points(lines3) == [tuple(p) for line in lines3 for p in line]
+
+    im = photo2cnccut.base.PIL.Image.open('cylinder.png')
+    mask = photo2cnccut.base.PIL.Image.new('L', im.size, 255)
+    mask.paste(0, (0, 0, im.width // 2, im.height))
+    mask.save(str(tmp_path / 'mask.png'))
+    lines4, _, _ = build({'mask': str(tmp_path / 'mask.png')})
+    points = cut_points(lines4)
+    assert points
+    assert all(x >= 14.5 for x, y, i in points)
+
+
+def test_plan_cache(tmp_path):
+    def build(pointer=None):
+        d = _build(build=False, line_angle=30, plan_cache=str(tmp_path))
+        d.load_image()
+        d.build_lines(pointer)
+        return d.lines
+
+    photo2cnccut.line._PLANS.clear()
+    lines = build()
+    assert len(list(tmp_path.iterdir())) == 1
+    assert lines == build(photo2cnccut.line.Pointer)
+
+    # a new process loads the plan from the cache directory
+    photo2cnccut.line._PLANS.clear()
+    assert build() == lines
+    plan = list(photo2cnccut.line._PLANS.values())[0]
+    assert build() == lines
+    assert list(photo2cnccut.line._PLANS.values()) == [plan]
+
+
+def test_plan_cache_key(monkeypatch):
+    class Walk(photo2cnccut.line.Data):
+        def walk(self, pointer=None):
+            return super().walk(pointer)[::2]
+
+    monkeypatch.setattr(photo2cnccut.line, 'PLAN_CACHE_SIZE', 2)
+    plans = photo2cnccut.line._PLANS
+    plans.clear()
+    lines = _build().lines
+    assert len(_build(Walk).lines) < len(lines)
+    assert len(plans) == 2
+
+    _build()  # the most recently used
+    _build(line_angle=30)
+    assert len(plans) == 2
+    assert _build().lines == lines
+    assert [k[0:2] for k in plans] == [
+        ('photo2cnccut.line', 'Data'), ('photo2cnccut.line', 'Data')]
+
+
+def test_in_memory(tmp_path, capsys):
+    config = {'width': 30, 'resolution': 0.4}
+    with open('cylinder.png', 'rb') as f:
+        image = f.read()
+    with open('cylinder.png.ref.nc', 'rb') as f:
+        ref_nc = f.read()
+    with open('cylinder.png.ref.svg', 'rb') as f:
+        ref_svg = f.read()
+
+    # no args, no files
+    cwd = os.getcwd()
+    os.chdir(str(tmp_path))
+    try:
+        d = photo2cnccut.line.Data(config=config)
+        d.build(image=image)
+        assert d.get_gcode() == ref_nc
+        assert d.get_svg() == ref_svg
+
+        f = io.StringIO()
+        d.write_gcode(file=f)
+        assert f.getvalue().encode('utf-8') == ref_nc
+        f = io.BytesIO()
+        d.write_draft(file=f)
+        assert f.getvalue().startswith(b'\x89PNG')
+
+        im = photo2cnccut.base.PIL.Image.open(io.BytesIO(image))
+        d = photo2cnccut.line.Data(config=config)
+        d.build(image=im)
+        assert d.get_gcode() == ref_nc
+    finally:
+        os.chdir(cwd)
+    assert not list(tmp_path.iterdir())
+    assert capsys.readouterr().out == ''  # quiet without args
+
+    numpy = pytest.importorskip('numpy')
+    d = photo2cnccut.line.Data(config=config)
+    d.build(image=numpy.asarray(im.convert('L')))
+    assert d.get_gcode() == ref_nc
+
+
 def test_cylinder():
     _test_main('cylinder.png')
 
 
+def test_svg_point():
+    _, args = photo2cnccut.ui._build_args([])
+    args.fname = 'cylinder.png'
+    config = {'width': 30, 'method': 'point'}
+    d = photo2cnccut.line.Data(config=config, args=args)
+    d.build()
+
+    def svg(svg_point):
+        d.conf.svg_point = svg_point
+        formatter = photo2cnccut.base.SVGFormatter(d.conf, d.lines)
+        return ''.join(formatter.format())
+
+    circle, use, path = svg('circle'), svg('use'), svg('path')
+    points = [p for line in d.lines for p in line if round(p[2]) != 255]
+    assert use.count('<use ') == len(points)
+    assert path.count('h0') == len(points)
+    assert use.count('<circle ') <= 256
+    assert len(use) < len(circle)
+    assert len(path) < len(use)
+
+    # points too small for the digit are omitted (not defined)
+    d.conf.digit = 2
+    use = svg('use')
+    hrefs = set(re.findall(r'href="#(\w+)"', use))
+    assert hrefs
+    assert hrefs <= set(re.findall(r'<circle id="(\w+)"', use))
+
+
 def _test_main(fname):
     ref = fname + '.ref'
     photo2cnccut.ui.main([fname])
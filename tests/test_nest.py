@@ -0,0 +1,104 @@
+import os
+import re
+
+import pytest
+
+import photo2cnccut.base
+import photo2cnccut.nest
+import photo2cnccut.ui
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+Piece = photo2cnccut.nest.Piece
+
+
+def _nest(pieces, **kwargs):
+    config, _ = photo2cnccut.ui._load_user_files('cylinder.png')
+    nest = photo2cnccut.nest.Nest(pieces, config=config, **kwargs)
+    nest.build()
+    return nest
+
+
+def test_one_piece():
+    nest = _nest([Piece('cylinder.png', position=(0, 0))])
+    with open('cylinder.png.ref.nc') as f:
+        assert ''.join(nest.format_gcode()) == f.read()
+
+
+def test_nest():
+    pieces = [
+        Piece('cylinder.png', position=(100, 0)),
+        Piece('cylinder.png'),
+        Piece('cylinder.png', {'line_angle': 0}),
+    ]
+    nest = _nest(pieces, plate=(150, 150))
+    positions = [p.position for p in nest.pieces]
+    assert sorted(positions) == [(5, 55), (40, 55), (100, 0)]
+
+    # nearest first
+    assert nest.pieces[0].position == min(positions, key=lambda p: p[0] + p[1])
+
+    text = ''.join(nest.format_gcode())
+    assert text.count('G0 X0 Y0') == 1
+    numbers = [int(n) for n in re.findall(r'^N(\d+)', text, re.M)]
+    assert numbers == list(range(2, 2 * len(numbers) + 1, 2))
+
+    moves = list(photo2cnccut.base.parse_gcode(text.splitlines()))
+    xs = [x for g, x, y, z in moves]
+    assert max(xs) > 100
+
+    seconds = nest._estimate_seconds()
+    single = _nest([Piece('cylinder.png', position=(0, 0))])
+    assert seconds > 2.5 * single._estimate_seconds()
+
+    svg = ''.join(nest.format_svg())
+    assert svg.count('<svg') == 4
+    assert svg.count('</svg>') == 4
+
+
+def test_svg_use():
+    config = {'method': 'point', 'svg_point': 'use'}
+    pieces = [
+        Piece('cylinder.png', dict(config, maxwidth=1.0), position=(0, 0)),
+        Piece('cylinder.png', dict(config, maxwidth=1.5), position=(40, 0)),
+    ]
+    svg = ''.join(_nest(pieces).format_svg())
+    ids = re.findall(r'<circle id="(\w+)"', svg)
+    assert len(ids) == len(set(ids))
+    for chunk in svg.split('<svg x=')[1:]:
+        defined = set(re.findall(r'<circle id="(\w+)"', chunk))
+        assert set(re.findall(r'href="#(\w+)"', chunk)) <= defined
+
+
+def test_empty_piece(tmp_path):
+    fname = str(tmp_path / 'white.png')
+    photo2cnccut.base.PIL.Image.new('L', (60, 100), 255).save(fname)
+    pieces = [
+        Piece(fname, {'width': 30, 'skip_blank': True}),
+        Piece('cylinder.png'),
+    ]
+    nest = _nest(pieces)
+    assert not nest.pieces[-1].data.lines
+    single = _nest([Piece('cylinder.png', position=nest.pieces[0].position)])
+    assert ''.join(nest.format_gcode()) == ''.join(single.format_gcode())
+    assert ''.join(nest.format_svg()).count('<svg') == 3
+
+
+def test_layout_error():
+    with pytest.raises(ValueError):
+        _nest([Piece('cylinder.png')], plate=(20, 20))
+    with pytest.raises(ValueError, match='fit'):
+        _nest([Piece('cylinder.png', position=(130, 0))], plate=(150, 150))
+    with pytest.raises(ValueError, match='overlap'):
+        _nest([Piece('cylinder.png', position=(0, 0)),
+            Piece('cylinder.png', position=(20, 40))])
+
+
+def test_main(tmp_path):
+    out = str(tmp_path / 'plate')
+    photo2cnccut.nest.main(
+        ['cylinder.png', 'cylinder.png@50,0', '-o', out, '-q'])
+    assert os.path.isfile(out + '.nc')
+    assert os.path.isfile(out + '.svg')
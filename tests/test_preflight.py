@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import photo2cnccut.line
+import photo2cnccut.preflight
+import photo2cnccut.ui
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+MONA = os.path.join(dirname, '..', 'mona2_3.jpg')
+
+# see photo2cnccut.preflight
+BOUND = 0.02  # points, blocks, cut time
+SIZE_BOUND = 0.04
+DEPTH_BOUND = 0.05
+MIN_DEPTH_BOUND = 0.1  # of max depth
+
+
+def _error(predicted, actual):
+    return abs(predicted / actual - 1)
+
+
+@pytest.mark.parametrize('image', ['cylinder.png', MONA])
+@pytest.mark.parametrize('method', ['line', 'point'])
+@pytest.mark.parametrize('line_angle', [0, 30, 70])
+@pytest.mark.parametrize('stepover, resolution, width', [
+    (1, 1, 30), (2, 0.3, 60), (1.5, 0.6, 100)])
+def test_preflight(image, method, line_angle, stepover, resolution, width):
+    config = {'width': width, 'resolution': resolution, 'method': method,
+        'line_angle': line_angle, 'stepover': stepover}
+    d = photo2cnccut.line.Data(config=config)
+    d.build(image=image)
+    formatter = d.g_formatter(d.conf, d.lines)
+    text = ''.join(formatter.format())
+    min_, max_ = formatter._get_depth_range()
+
+    estimates = (
+        photo2cnccut.preflight.get_estimate(d),
+        photo2cnccut.preflight.preflight(
+            photo2cnccut.line.Data(config=config), image),
+    )
+    for estimate in estimates:
+        assert abs(estimate.lines - len(d.lines)) <= 1
+        assert _error(estimate.points, sum(map(len, d.lines))) < BOUND
+        assert _error(estimate.blocks, text.count('\n')) < BOUND
+        assert _error(estimate.size, len(text)) < SIZE_BOUND
+        assert _error(estimate.seconds,
+            formatter._estimate_seconds()) < BOUND
+        assert abs(estimate.depth_range[0] - min_) < (
+            abs(max_) * MIN_DEPTH_BOUND)
+        assert _error(estimate.depth_range[1], max_) < DEPTH_BOUND
+
+
+def test_main(capsys):
+    photo2cnccut.ui.main(['cylinder.png', '--preflight'])
+    out = capsys.readouterr().out
+    assert 'estimated cut time' in out
+    assert not os.path.exists('cylinder.png.nc')
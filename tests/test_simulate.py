@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import photo2cnccut.base
+import photo2cnccut.line
+import photo2cnccut.ui
+
+numpy = pytest.importorskip('numpy')
+import photo2cnccut.simulate  # noqa: E402
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+
+def test_parse_gcode():
+    lines = ['N2 G0 X0 Y0', 'Z3.', 'X1.5 Y-2', 'G1 Z-0.2',
+        'X2. Y-2 Z-0.1', 'N4 G0 Z1. M1', 'G1']
+    moves = list(photo2cnccut.base.parse_gcode(lines))
+    assert moves == [
+        (0, 0, 0, 0), (0, 0, 0, 3), (0, 1.5, -2, 3), (1, 1.5, -2, -0.2),
+        (1, 2, -2, -0.1), (0, 2, -2, 1)]
+
+
+def test_simulate():
+    fname = 'cylinder.png'
+    _, args = photo2cnccut.ui._build_args(['-q', fname])
+    config, _ = photo2cnccut.ui._load_user_files(os.path.abspath(fname))
+    d = photo2cnccut.line.Data(config=config, args=args)
+    d.build()
+
+    sim = photo2cnccut.simulate.Simulator(d.conf)
+    with open(fname + '.ref.nc') as f:
+        sim.run(photo2cnccut.base.parse_gcode(f))
+
+    assert sim.rapid_cuts == 0
+    depth = -sim.heightmap.min()
+    assert abs(depth - 0.398) < 0.01
+    assert sim.get_error(d._im) < 20
+
+
+def test_main():
+    fname = 'cylinder.png'
+    photo2cnccut.ui.main(['-q', '-s', '-S', fname])  # g-code is written
+    for ext in ('.nc', '.svg', '.sim.png'):
+        assert os.path.isfile(fname + ext)
+        os.remove(fname + ext)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import photo2cnccut.base
+import photo2cnccut.line
+import photo2cnccut.toolpath
+import photo2cnccut.ui
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+datadir = os.path.join(dirname, 'data')
+os.chdir(datadir)
+
+
+def _format(formatter, conf, lines):
+    return ''.join(formatter(conf, lines).format())
+
+
+@pytest.mark.parametrize('method', ['line', 'point'])
+def test_toolpath(method):
+    _, args = photo2cnccut.ui._build_args([])
+    args.fname = 'cylinder.png'
+    config = {'width': 30, 'resolution': 0.4, 'method': method}
+    d = photo2cnccut.line.Data(config=config, args=args)
+    d.build()
+    d.write_toolpath()
+
+    fname = args.fname + photo2cnccut.toolpath.EXT
+    with photo2cnccut.toolpath.Toolpath(fname) as path:
+        assert path.config['method'] == method
+        lines = path.lines
+        assert len(lines) == len(d.lines)
+        assert list(lines[-1]) == [tuple(p) for p in d.lines[-1]]
+        assert lines[0][-1] == tuple(d.lines[0][-1])
+
+        for formatter in (photo2cnccut.base.GFormatter,
+                photo2cnccut.base.SVGFormatter):
+            new = _format(formatter, d.conf, lines)
+            assert new == _format(formatter, d.conf, d.lines)
+    os.remove(fname)
+
+
+def test_toolpath_main(monkeypatch):
+    Toolpath = photo2cnccut.toolpath.Toolpath
+    closed = []
+    close = Toolpath.close
+    monkeypatch.setattr(Toolpath, 'close',
+        lambda self: closed.append(self.fname) or close(self))
+
+    fname = 'cylinder.png'
+    photo2cnccut.ui.main(['-q', '--toolpath', fname])
+    assert not os.path.isfile(fname + '.nc')
+    photo2cnccut.ui.main(['-q', fname + photo2cnccut.toolpath.EXT])
+    assert closed == [fname + photo2cnccut.toolpath.EXT]
+    for option in (['--draft'], ['--preflight'], ['--budget', '10'],
+            ['--sweep', 'stepover=1,2']):
+        with pytest.raises(ValueError, match='toolpath'):
+            photo2cnccut.ui.main(
+                ['-q'] + option + [fname + photo2cnccut.toolpath.EXT])
+    os.remove(fname + photo2cnccut.toolpath.EXT)
+
+    ref = fname + '.ref'
+    for ext in ('.nc', '.svg'):
+        with open(fname + ext) as f, open(ref + ext) as g:
+            assert f.read() == g.read()
+        os.remove(fname + ext)
+
+
+def test_invalid(tmp_path):
+    fname = str(tmp_path / 'a.p2c')
+    with open(fname, 'wb') as f:
+        f.write(b'\0' * 64)
+    with pytest.raises(photo2cnccut.toolpath.ToolpathError):
+        photo2cnccut.toolpath.Toolpath(fname)